@@ -0,0 +1,914 @@
+/*
+ * Compiled core of solver.Solver
+ *
+ * The same search as the Python code in solver.py: yes/no searches with
+ * alpha-beta cutoffs, quick-trick and top-trump bounds, the partition
+ * transposition table and the same move ordering. The table is a tree per
+ * key that branches on the holders of the top cards, suit by suit, so it
+ * may try its entries in another order and visit a few other nodes than
+ * the Python code, the answers are the same. Build it with
+ *
+ *     $ python setup.py build_ext --inplace
+ */
+
+#include <Python.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define SUIT_MASK(suit) ((uint64_t)0x1fff << (13 * (suit)))
+#define BIT(card) ((uint64_t)1 << (card))
+
+static int
+popcount(uint64_t mask)
+{
+    return __builtin_popcountll(mask);
+}
+
+/* Index of the highest card in a non-empty mask */
+static int
+top_index(uint64_t mask)
+{
+    return 63 - __builtin_clzll(mask);
+}
+
+static uint64_t
+top_bit(uint64_t mask)
+{
+    return BIT(top_index(mask));
+}
+
+/* Transposition table: one slot per leader and suit lengths, holding a
+   tree of entries with a level per suit. A node pins down who holds the
+   top count cards of its suit, the nodes of the last suit hold bounds. */
+
+typedef struct Node Node;
+
+struct Node {
+    uint32_t pattern;       /* Holders of the pinned cards, high to low */
+    uint8_t count;          /* Number of pinned cards */
+    int8_t lower;           /* Tricks known to be reachable */
+    int8_t upper;           /* Most tricks that can still be reached */
+    int8_t best_suit;
+    int size;
+    int capacity;
+    Node *children;         /* Nodes of the next suit, side by side */
+};
+
+typedef struct {
+    uint64_t lengths;
+    int leader;             /* -1 for an empty slot */
+    Node root;              /* Its children are the nodes of the first suit */
+} Slot;
+
+typedef struct {
+    int lengths;            /* Four bits per seat */
+    int total;
+    uint32_t pattern;       /* Holders of the cards, two bits per card */
+} Suit;
+
+typedef struct {
+    PyObject_HEAD
+    int trump;
+    uint64_t trump_mask;
+    int offensive[4];
+    Slot *slots;
+    size_t capacity;
+    size_t used;
+    long long nodes;
+} Search;
+
+static uint64_t
+hash_key(uint64_t lengths, int leader)
+{
+    uint64_t h = (lengths ^ ((uint64_t)leader << 62)) * 0x9e3779b97f4a7c15ULL;
+    return h ^ (h >> 29);
+}
+
+static Slot *
+new_slots(size_t capacity)
+{
+    size_t i;
+    Slot *slots = calloc(capacity, sizeof(Slot));
+    if (slots == NULL)
+        return NULL;
+    for (i = 0; i < capacity; i++)
+        slots[i].leader = -1;
+    return slots;
+}
+
+static void
+free_children(Node *node)
+{
+    int i;
+    for (i = 0; i < node->size; i++)
+        free_children(&node->children[i]);
+    free(node->children);
+}
+
+static void
+free_slots(Slot *slots, size_t capacity)
+{
+    size_t i;
+    if (slots == NULL)
+        return;
+    for (i = 0; i < capacity; i++)
+        free_children(&slots[i].root);
+    free(slots);
+}
+
+static Slot *
+probe(Slot *slots, size_t capacity, uint64_t lengths, int leader)
+{
+    size_t i = hash_key(lengths, leader) & (capacity - 1);
+    while (slots[i].leader >= 0 &&
+           (slots[i].lengths != lengths || slots[i].leader != leader))
+        i = (i + 1) & (capacity - 1);
+    return &slots[i];
+}
+
+static int
+grow(Search *self)
+{
+    size_t i, capacity = self->capacity * 2;
+    Slot *slots = new_slots(capacity);
+    if (slots == NULL)
+        return -1;
+    for (i = 0; i < self->capacity; i++) {
+        Slot *old = &self->slots[i];
+        if (old->leader >= 0)
+            *probe(slots, capacity, old->lengths, old->leader) = *old;
+    }
+    free(self->slots);
+    self->slots = slots;
+    self->capacity = capacity;
+    return 0;
+}
+
+/* Slot of a trick start, NULL when out of memory */
+static Slot *
+lookup(Search *self, uint64_t lengths, int leader, int create)
+{
+    Slot *slot = probe(self->slots, self->capacity, lengths, leader);
+    if (slot->leader >= 0 || !create)
+        return slot;
+    if (2 * (self->used + 1) > self->capacity) {
+        if (grow(self) < 0)
+            return NULL;
+        slot = probe(self->slots, self->capacity, lengths, leader);
+    }
+    slot->lengths = lengths;
+    slot->leader = leader;
+    self->used++;
+    return slot;
+}
+
+/* Child of parent with count and pattern, added if needed, NULL when out
+   of memory */
+static Node *
+add_child(Node *parent, uint8_t count, uint32_t pattern, int remaining)
+{
+    Node *node;
+    int i;
+    for (i = 0; i < parent->size; i++)
+        if (parent->children[i].count == count &&
+            parent->children[i].pattern == pattern)
+            return &parent->children[i];
+    if (parent->size == parent->capacity) {
+        int capacity = parent->capacity ? 2 * parent->capacity : 2;
+        Node *children = realloc(parent->children, capacity * sizeof(Node));
+        if (children == NULL)
+            return NULL;
+        parent->children = children;
+        parent->capacity = capacity;
+    }
+    node = &parent->children[parent->size++];
+    memset(node, 0, sizeof(Node));
+    node->pattern = pattern;
+    node->count = count;
+    node->upper = remaining;
+    node->best_suit = -1;
+    return node;
+}
+
+/* Rules */
+
+static int
+winning(Search *self, const int *trick, int n)
+{
+    int i, best = 0;
+    for (i = 1; i < n; i++) {
+        int card = trick[i], top = trick[best];
+        if (card / 13 == top / 13) {
+            if (card > top)
+                best = i;
+        }
+        else if (card / 13 == self->trump)
+            best = i;
+    }
+    return best;
+}
+
+static uint64_t
+rank_mattered(const int *trick, int n, int position)
+{
+    int i, suit = trick[position] / 13;
+    for (i = 0; i < n; i++)
+        if (i != position && trick[i] / 13 == suit)
+            return BIT(trick[position]);
+    return 0;
+}
+
+static int
+holder(const uint64_t *hands, uint64_t card)
+{
+    int seat;
+    for (seat = 0; seat < 4; seat++)
+        if (hands[seat] & card)
+            return seat;
+    return -1;
+}
+
+/* Bounds */
+
+static int
+quick_tricks(Search *self, const uint64_t *hands, int leader,
+             uint64_t *relevant)
+{
+    uint64_t hand = hands[leader];
+    uint64_t remaining = hands[0] | hands[1] | hands[2] | hands[3];
+    uint64_t trump_mask = self->trump_mask;
+    uint64_t opponents[4];
+    int seat, suit, count = 0, tricks = 0;
+
+    *relevant = 0;
+    if (trump_mask) {
+        uint64_t trumps = remaining & trump_mask;
+        while (trumps) {
+            uint64_t top = top_bit(trumps);
+            if (!(hand & top))
+                break;
+            trumps ^= top;
+            *relevant |= top;
+            tricks++;
+        }
+        for (seat = 0; seat < 4; seat++)
+            if (self->offensive[seat] != self->offensive[leader] &&
+                popcount(hands[seat] & trump_mask) > tricks)
+                opponents[count++] = hands[seat];
+    }
+
+    for (suit = 0; suit < 4; suit++) {
+        uint64_t suit_mask = SUIT_MASK(suit), cards;
+        int i, limit = 13;
+        if (suit_mask == trump_mask)
+            continue;
+        for (i = 0; i < count; i++) {
+            int length = popcount(opponents[i] & suit_mask);
+            if (length < limit)
+                limit = length;
+        }
+        cards = remaining & suit_mask;
+        while (cards && limit) {
+            uint64_t top = top_bit(cards);
+            if (!(hand & top))
+                break;
+            cards ^= top;
+            *relevant |= top;
+            tricks++;
+            limit--;
+        }
+    }
+    return tricks;
+}
+
+static int
+top_trumps(Search *self, const uint64_t *hands, int *sure, uint64_t *run)
+{
+    uint64_t trumps[4], remaining, below;
+    int seat, side;
+
+    for (seat = 0; seat < 4; seat++)
+        trumps[seat] = hands[seat] & self->trump_mask;
+    remaining = trumps[0] | trumps[1] | trumps[2] | trumps[3];
+    *sure = 0;
+    *run = 0;
+    if (!remaining)
+        return 0;
+    side = self->offensive[holder(trumps, top_bit(remaining))];
+    *run = remaining;
+    for (seat = 0; seat < 4; seat++)
+        if (self->offensive[seat] != side && trumps[seat])
+            *run &= ~((BIT(top_index(trumps[seat])) << 1) - 1);
+    for (seat = 0; seat < 4; seat++)
+        if (self->offensive[seat] == side) {
+            int count = popcount(trumps[seat] & *run);
+            if (count > *sure)
+                *sure = count;
+        }
+    below = remaining & ~*run;
+    if (below)
+        *run |= top_bit(below);
+    return side;
+}
+
+/* Table entries */
+
+static uint64_t
+describe(const uint64_t *hands, Suit *suits)
+{
+    uint64_t lengths = 0;
+    int suit, seat;
+    for (suit = 0; suit < 4; suit++) {
+        uint64_t holding[4], cards = 0;
+        Suit *description = &suits[suit];
+        description->lengths = 0;
+        for (seat = 0; seat < 4; seat++) {
+            holding[seat] = hands[seat] & SUIT_MASK(suit);
+            description->lengths |= popcount(holding[seat]) << (4 * seat);
+            cards |= holding[seat];
+        }
+        description->total = popcount(cards);
+        description->pattern = 0;
+        while (cards) {
+            uint64_t top = top_bit(cards);
+            cards ^= top;
+            description->pattern = description->pattern << 2 |
+                holder(holding, top);
+        }
+        lengths |= (uint64_t)description->lengths << (16 * suit);
+    }
+    return lengths;
+}
+
+static uint64_t
+top_cards(const uint8_t *count, const uint64_t *hands)
+{
+    uint64_t remaining = hands[0] | hands[1] | hands[2] | hands[3];
+    uint64_t cards = 0;
+    int suit, i;
+    for (suit = 0; suit < 4; suit++) {
+        uint64_t held = remaining & SUIT_MASK(suit);
+        for (i = 0; i < count[suit]; i++) {
+            uint64_t top = top_bit(held);
+            held ^= top;
+            cards |= top;
+        }
+    }
+    return cards;
+}
+
+/* Whether the entries under parent decide target, 1 or 0, -1 if none
+   does. Sets count to the cards pinned down by the entry that decides and
+   best_suit to that of the last entry that matched. */
+static int
+find(const Node *parent, int suit, const Suit *suits, int target,
+     uint8_t *count, int *best_suit)
+{
+    int i;
+    for (i = 0; i < parent->size; i++) {
+        const Node *node = &parent->children[i];
+        if (node->count && suits[suit].pattern >>
+                2 * (suits[suit].total - node->count) != node->pattern)
+            continue;
+        count[suit] = node->count;
+        if (suit < 3) {
+            int result = find(node, suit + 1, suits, target, count,
+                              best_suit);
+            if (result >= 0)
+                return result;
+        }
+        else if (node->lower >= target)
+            return 1;
+        else if (node->upper < target)
+            return 0;
+        else
+            *best_suit = node->best_suit;
+    }
+    return -1;
+}
+
+static int
+store(Search *self, uint64_t lengths, int leader, const Suit *suits,
+      const uint64_t *hands, uint64_t relevant, int result, int target,
+      int remaining, int best_suit)
+{
+    uint64_t cards = hands[0] | hands[1] | hands[2] | hands[3];
+    Slot *slot = lookup(self, lengths, leader, 1);
+    Node *node;
+    int suit;
+
+    if (slot == NULL)
+        return -1;
+    node = &slot->root;
+    for (suit = 0; suit < 4; suit++) {
+        uint64_t suit_relevant = relevant & SUIT_MASK(suit);
+        int count = 0;
+        uint32_t pattern = 0;
+        if (suit_relevant) {
+            uint64_t lowest = suit_relevant & -suit_relevant;
+            count = popcount(cards & SUIT_MASK(suit) & ~(lowest - 1));
+            pattern = suits[suit].pattern >> 2 * (suits[suit].total - count);
+        }
+        node = add_child(node, count, pattern, remaining);
+        if (node == NULL)
+            return -1;
+    }
+    if (result) {
+        if (target > node->lower)
+            node->lower = target;
+    }
+    else if (target - 1 < node->upper)
+        node->upper = target - 1;
+    node->best_suit = best_suit;
+    return 0;
+}
+
+/* Move generation */
+
+static int
+groups(uint64_t cards, uint64_t remaining, int *out)
+{
+    uint64_t previous = 0;
+    int count = 0;
+    while (cards) {
+        uint64_t top = top_bit(cards);
+        cards ^= top;
+        if (!previous || (remaining & ~((top << 1) - 1) & (previous - 1)))
+            out[count++] = top_index(top);
+        previous = top;
+    }
+    return count;
+}
+
+static int
+leads(Search *self, const uint64_t *hands, int leader, int best_suit,
+      int *out)
+{
+    uint64_t hand = hands[leader];
+    uint64_t remaining = hands[0] | hands[1] | hands[2] | hands[3];
+    int side = self->offensive[leader];
+    int first[13], cash[4], towards[4], rest[13];
+    int nfirst = 0, ncash = 0, ntowards = 0, nrest = 0;
+    int suit, i, count;
+
+    for (suit = 0; suit < 4; suit++) {
+        int cards[13], n = groups(hand & SUIT_MASK(suit), remaining, cards);
+        uint64_t top;
+        if (!n)
+            continue;
+        if (cards[0] / 13 == best_suit) {
+            for (i = 0; i < n; i++)
+                first[nfirst++] = cards[i];
+            continue;
+        }
+        top = top_bit(remaining & SUIT_MASK(suit));
+        if (hand & top) {
+            cash[ncash++] = cards[0];
+            for (i = 1; i < n; i++)
+                rest[nrest++] = cards[i];
+        }
+        else if (self->offensive[holder(hands, top)] == side) {
+            towards[ntowards++] = cards[n - 1];
+            for (i = 0; i < n - 1; i++)
+                rest[nrest++] = cards[i];
+        }
+        else
+            for (i = n - 1; i >= 0; i--)
+                rest[nrest++] = cards[i];
+    }
+    count = 0;
+    for (i = 0; i < nfirst; i++)
+        out[count++] = first[i];
+    for (i = 0; i < ncash; i++)
+        out[count++] = cash[i];
+    for (i = 0; i < ntowards; i++)
+        out[count++] = towards[i];
+    for (i = 0; i < nrest; i++)
+        out[count++] = rest[i];
+    return count;
+}
+
+static int
+moves(Search *self, const uint64_t *hands, int seat, const int *trick,
+      int n, int *out)
+{
+    uint64_t hand = hands[seat];
+    uint64_t in_suit = hand & SUIT_MASK(trick[0] / 13);
+    uint64_t remaining = hands[0] | hands[1] | hands[2] | hands[3];
+    int candidates[13], winners[13], losers[13];
+    int count = 0, nwinners = 0, nlosers = 0;
+    int suit, i, position, best, winning_seat;
+
+    if (in_suit)
+        hand = in_suit;
+    for (i = 0; i < n; i++)
+        remaining |= BIT(trick[i]);
+    for (suit = 0; suit < 4; suit++)
+        if (hand & SUIT_MASK(suit))
+            count += groups(hand & SUIT_MASK(suit), remaining,
+                            candidates + count);
+    if (count < 2) {
+        if (count)
+            out[0] = candidates[0];
+        return count;
+    }
+
+    /* Duck when our side already wins the trick, otherwise try the
+       cheapest card that takes it first */
+    position = winning(self, trick, n);
+    best = trick[position];
+    for (i = count - 1; i >= 0; i--) {
+        int card = candidates[i];
+        if (card / 13 == best / 13) {
+            if (card > best)
+                winners[nwinners++] = card;
+            else
+                losers[nlosers++] = card;
+        }
+        else if (card / 13 == self->trump)
+            winners[nwinners++] = card;
+        else
+            losers[nlosers++] = card;
+    }
+    winning_seat = (seat - n + position + 8) % 4;
+    count = 0;
+    if (self->offensive[winning_seat] == self->offensive[seat]) {
+        for (i = 0; i < nlosers; i++)
+            out[count++] = losers[i];
+        for (i = 0; i < nwinners; i++)
+            out[count++] = winners[i];
+    }
+    else {
+        for (i = 0; i < nwinners; i++)
+            out[count++] = winners[i];
+        for (i = 0; i < nlosers; i++)
+            out[count++] = losers[i];
+    }
+    return count;
+}
+
+/* Search, results are 1 or 0 and -1 when out of memory */
+
+static int search(Search *self, uint64_t *hands, int leader, int target,
+                  uint64_t *relevant);
+
+static int
+play(Search *self, uint64_t *hands, int leader, int *trick, int n,
+     int target, uint64_t *relevant)
+{
+    uint64_t hand, cards;
+    int seat, attacking, count, i, result;
+    int options[13];
+
+    self->nodes++;
+    if (n == 4) {
+        int position = winning(self, trick, 4);
+        int winner = (leader + position) % 4;
+        result = search(self, hands, winner,
+                        target - self->offensive[winner], relevant);
+        *relevant |= rank_mattered(trick, 4, position);
+        return result;
+    }
+
+    seat = (leader + n) % 4;
+    hand = hands[seat];
+    attacking = self->offensive[seat];
+    *relevant = 0;
+    count = moves(self, hands, seat, trick, n, options);
+    for (i = 0; i < count; i++) {
+        hands[seat] = hand ^ BIT(options[i]);
+        trick[n] = options[i];
+        result = play(self, hands, leader, trick, n + 1, target, &cards);
+        hands[seat] = hand;
+        if (result < 0)
+            return result;
+        if (result == attacking) {
+            *relevant = cards;
+            return result;
+        }
+        *relevant |= cards;
+    }
+    return !attacking;
+}
+
+static int
+search(Search *self, uint64_t *hands, int leader, int target,
+       uint64_t *relevant)
+{
+    Suit suits[4];
+    Slot *slot;
+    uint64_t lengths, hand, cards;
+    int remaining, quick, attacking, best_suit = -1, result, i, count;
+    int trick[4], options[13];
+
+    *relevant = 0;
+    if (target <= 0)
+        return 1;
+    remaining = popcount(hands[leader]);
+    if (target > remaining)
+        return 0;
+
+    if (remaining == 1) {
+        int position;
+        for (i = 0; i < 4; i++)
+            trick[i] = top_index(hands[(leader + i) % 4]);
+        position = winning(self, trick, 4);
+        *relevant = rank_mattered(trick, 4, position);
+        return self->offensive[(leader + position) % 4];
+    }
+
+    quick = quick_tricks(self, hands, leader, relevant);
+    if (self->offensive[leader]) {
+        if (quick >= target)
+            return 1;
+    }
+    else if (target > remaining - quick)
+        return 0;
+    if (self->trump_mask) {
+        int sure;
+        attacking = top_trumps(self, hands, &sure, relevant);
+        if (attacking) {
+            if (sure >= target)
+                return 1;
+        }
+        else if (target > remaining - sure)
+            return 0;
+    }
+
+    lengths = describe(hands, suits);
+    slot = lookup(self, lengths, leader, 0);
+    if (slot->leader >= 0) {
+        uint8_t count[4];
+        result = find(&slot->root, 0, suits, target, count, &best_suit);
+        if (result >= 0) {
+            *relevant = top_cards(count, hands);
+            return result;
+        }
+    }
+
+    attacking = self->offensive[leader];
+    hand = hands[leader];
+    result = !attacking;
+    *relevant = 0;
+    count = leads(self, hands, leader, best_suit, options);
+    for (i = 0; i < count; i++) {
+        int found;
+        hands[leader] = hand ^ BIT(options[i]);
+        trick[0] = options[i];
+        found = play(self, hands, leader, trick, 1, target, &cards);
+        hands[leader] = hand;
+        if (found < 0)
+            return found;
+        if (found == attacking) {
+            result = found;
+            *relevant = cards;
+            best_suit = options[i] / 13;
+            break;
+        }
+        *relevant |= cards;
+    }
+
+    if (store(self, lengths, leader, suits, hands, *relevant, result,
+              target, remaining, best_suit) < 0)
+        return -1;
+    return result;
+}
+
+/* Python type */
+
+static int
+Search_init(Search *self, PyObject *args, PyObject *kwds)
+{
+    static char *kwlist[] = {"trump", "offensive", NULL};
+    PyObject *offensive, *item;
+    Py_ssize_t i, size;
+    int seat;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "iO", kwlist,
+                                     &self->trump, &offensive))
+        return -1;
+    self->trump_mask = self->trump >= 0 && self->trump < 4 ?
+        SUIT_MASK(self->trump) : 0;
+    offensive = PySequence_Fast(offensive, "offensive must be a sequence");
+    if (offensive == NULL)
+        return -1;
+    memset(self->offensive, 0, sizeof(self->offensive));
+    size = PySequence_Fast_GET_SIZE(offensive);
+    for (i = 0; i < size; i++) {
+        item = PySequence_Fast_GET_ITEM(offensive, i);
+        seat = (int)PyInt_AsLong(item);
+        if (seat == -1 && PyErr_Occurred()) {
+            Py_DECREF(offensive);
+            return -1;
+        }
+        if (seat < 0 || seat > 3) {
+            Py_DECREF(offensive);
+            PyErr_SetString(PyExc_ValueError, "seats are 0 to 3");
+            return -1;
+        }
+        self->offensive[seat] = 1;
+    }
+    Py_DECREF(offensive);
+
+    free_slots(self->slots, self->capacity);
+    self->capacity = 1024;
+    self->used = 0;
+    self->nodes = 0;
+    self->slots = new_slots(self->capacity);
+    if (self->slots == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    return 0;
+}
+
+static void
+Search_dealloc(Search *self)
+{
+    free_slots(self->slots, self->capacity);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static int
+read_cards(PyObject *sequence, uint64_t *cards, int limit, int masks)
+{
+    PyObject *items = PySequence_Fast(sequence, "expected a sequence");
+    Py_ssize_t i, size;
+    if (items == NULL)
+        return -1;
+    size = PySequence_Fast_GET_SIZE(items);
+    if (size > limit || (masks && size != limit)) {
+        Py_DECREF(items);
+        PyErr_SetString(PyExc_ValueError, "wrong number of items");
+        return -1;
+    }
+    for (i = 0; i < size; i++) {
+        PyObject *item = PySequence_Fast_GET_ITEM(items, i);
+        if (PyInt_Check(item))
+            cards[i] = PyInt_AsUnsignedLongLongMask(item);
+        else if (PyLong_Check(item))
+            cards[i] = PyLong_AsUnsignedLongLongMask(item);
+        else {
+            Py_DECREF(items);
+            PyErr_SetString(PyExc_TypeError, "expected integers");
+            return -1;
+        }
+        if (!masks && cards[i] >= 52) {
+            Py_DECREF(items);
+            PyErr_SetString(PyExc_ValueError, "cards are 0 to 51");
+            return -1;
+        }
+    }
+    Py_DECREF(items);
+    return (int)size;
+}
+
+/* Do the hands and the trick make a position the search can take? Every
+   card at most once, at most 13 per hand and the same number per seat once
+   the trick is complete. */
+static int
+check_position(uint64_t *hands, int leader, int *trick, int n)
+{
+    uint64_t seen = 0;
+    int i, seat, length = -1;
+
+    for (i = 0; i < 4; i++) {
+        if (hands[i] >> 52 || hands[i] & seen)
+            return 0;
+        seen |= hands[i];
+    }
+    for (i = 0; i < n; i++) {
+        if (seen & BIT(trick[i]))
+            return 0;
+        seen |= BIT(trick[i]);
+    }
+    for (i = 0; i < 4; i++) {
+        seat = (leader + i) % 4;
+        if (length < 0)
+            length = popcount(hands[seat]) + (i < n);
+        else if (popcount(hands[seat]) + (i < n) != length)
+            return 0;
+    }
+    return length <= 13;
+}
+
+static PyObject *
+Search_solve(Search *self, PyObject *args)
+{
+    PyObject *hand_list, *trick_list = NULL;
+    uint64_t hands[4], played[4], relevant;
+    int leader, n = 0, i, total, low, high, trick[4];
+
+    if (!PyArg_ParseTuple(args, "Oi|O", &hand_list, &leader, &trick_list))
+        return NULL;
+    if (leader < 0 || leader > 3) {
+        PyErr_SetString(PyExc_ValueError, "seats are 0 to 3");
+        return NULL;
+    }
+    if (read_cards(hand_list, hands, 4, 1) < 0)
+        return NULL;
+    if (trick_list != NULL &&
+        (n = read_cards(trick_list, played, 4, 0)) < 0)
+        return NULL;
+    for (i = 0; i < n; i++)
+        trick[i] = (int)played[i];
+    if (!check_position(hands, leader, trick, n)) {
+        PyErr_SetString(PyExc_ValueError,
+                        "hands and trick do not make a position");
+        return NULL;
+    }
+
+    total = popcount(hands[leader]) + (n ? 1 : 0);
+    low = 0;
+    high = total;
+    while (low < high) {
+        int target = (low + high + 1) / 2, result;
+        if (n)
+            result = play(self, hands, leader, trick, n, target, &relevant);
+        else
+            result = search(self, hands, leader, target, &relevant);
+        if (result < 0)
+            return PyErr_NoMemory();
+        if (result)
+            low = target;
+        else
+            high = target - 1;
+    }
+    return PyInt_FromLong(low);
+}
+
+static PyObject *
+Search_get_nodes(Search *self, void *closure)
+{
+    return PyLong_FromLongLong(self->nodes);
+}
+
+static PyMethodDef Search_methods[] = {
+    {"solve", (PyCFunction)Search_solve, METH_VARARGS,
+     "solve(hands, leader, trick=())\n\n"
+     "Maximum number of remaining tricks the offensive side can take, from\n"
+     "card masks per seat and the card indexes played to the trick"},
+    {NULL}
+};
+
+static PyGetSetDef Search_getset[] = {
+    {"nodes", (getter)Search_get_nodes, NULL, "Cards tried so far", NULL},
+    {NULL}
+};
+
+static PyTypeObject SearchType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_solver.Search",               /* tp_name */
+    sizeof(Search),                 /* tp_basicsize */
+    0,                              /* tp_itemsize */
+    (destructor)Search_dealloc,     /* tp_dealloc */
+    0,                              /* tp_print */
+    0,                              /* tp_getattr */
+    0,                              /* tp_setattr */
+    0,                              /* tp_compare */
+    0,                              /* tp_repr */
+    0,                              /* tp_as_number */
+    0,                              /* tp_as_sequence */
+    0,                              /* tp_as_mapping */
+    0,                              /* tp_hash */
+    0,                              /* tp_call */
+    0,                              /* tp_str */
+    0,                              /* tp_getattro */
+    0,                              /* tp_setattro */
+    0,                              /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,             /* tp_flags */
+    "Search(trump, offensive)\n\n"
+    "Double-dummy search for one trump suit and offensive side, its\n"
+    "transposition table is kept between solves",   /* tp_doc */
+    0,                              /* tp_traverse */
+    0,                              /* tp_clear */
+    0,                              /* tp_richcompare */
+    0,                              /* tp_weaklistoffset */
+    0,                              /* tp_iter */
+    0,                              /* tp_iternext */
+    Search_methods,                 /* tp_methods */
+    0,                              /* tp_members */
+    Search_getset,                  /* tp_getset */
+    0,                              /* tp_base */
+    0,                              /* tp_dict */
+    0,                              /* tp_descr_get */
+    0,                              /* tp_descr_set */
+    0,                              /* tp_dictoffset */
+    (initproc)Search_init,          /* tp_init */
+    0,                              /* tp_alloc */
+    PyType_GenericNew,              /* tp_new */
+};
+
+PyMODINIT_FUNC
+init_solver(void)
+{
+    PyObject *module;
+    if (PyType_Ready(&SearchType) < 0)
+        return;
+    module = Py_InitModule3("_solver", NULL, "Compiled core of solver.py");
+    if (module == NULL)
+        return;
+    Py_INCREF(&SearchType);
+    PyModule_AddObject(module, "Search", (PyObject *)&SearchType);
+}
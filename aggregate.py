@@ -0,0 +1,112 @@
+import multiprocessing
+
+from whist import SUIT_MASKS, GameMode, popcount
+from simulation import iter_deals, new_seed
+
+
+def tally(table, key, won):
+    entry = table.setdefault(key, [0, 0])
+    entry[0] += 1
+    entry[1] += won
+
+
+class DealStats(object):
+    """
+    Running statistics over DealResults, in memory that does not grow with
+    the number of deals
+
+    Keeps offensive results per bid combination (the bids in bidding order),
+    the distribution of tricks taken per seat and offensive results per
+    number of trumps the offensive side was dealt. Stats of separate runs
+    are combined with merge.
+    """
+
+    def __init__(self):
+        self.deals = 0
+        self.bids = {}          # Bids in bidding order -> [deals, won]
+        self.tricks = [[0] * 14 for seat in xrange(4)]
+        self.trumps = {}        # Offensive trump count -> [deals, won]
+
+    def add(self, result):
+        self.deals += 1
+        won = result.winning_side == GameMode.OFFENSIVE
+        bids = tuple(result.bids[(result.dealer + 1 + i) % 4]
+                     for i in xrange(4))
+        tally(self.bids, bids, won)
+        for seat, tricks in enumerate(result.tricks):
+            self.tricks[seat][tricks] += 1
+        if result.offensive:
+            trump_mask = SUIT_MASKS[result.trump.suit]
+            trumps = sum(popcount(result.hands[seat] & trump_mask)
+                         for seat in result.offensive)
+            tally(self.trumps, trumps, won)
+
+    def update(self, results):
+        for result in results:
+            self.add(result)
+        return self
+
+    def merge(self, other):
+        self.deals += other.deals
+        for mine, theirs in ((self.bids, other.bids),
+                             (self.trumps, other.trumps)):
+            for key, (deals, won) in theirs.iteritems():
+                entry = mine.setdefault(key, [0, 0])
+                entry[0] += deals
+                entry[1] += won
+        for seat in xrange(4):
+            for tricks in xrange(14):
+                self.tricks[seat][tricks] += other.tricks[seat][tricks]
+        return self
+
+    def success_rates(self):
+        """
+        (deals, offensive success rate) per bid combination
+        """
+        return dict((bids, (deals, float(won) / deals))
+                    for bids, (deals, won) in self.bids.iteritems())
+
+    def trump_rates(self):
+        """
+        (deals, offensive success rate) per offensive trump count
+        """
+        return dict((trumps, (deals, float(won) / deals))
+                    for trumps, (deals, won) in self.trumps.iteritems())
+
+    def trick_distribution(self, seat):
+        """
+        Fraction of deals in which seat took 0 .. 13 tricks
+        """
+        return [float(n) / self.deals if self.deals else 0.0
+                for n in self.tricks[seat]]
+
+    def __repr__(self):
+        return '<DealStats: %d deals>' % self.deals
+
+
+def _aggregate_chunk(args):
+    players, seed, start, count = args
+    return DealStats().update(iter_deals(count, players, seed, start))
+
+
+def parallel_aggregate(n_deals, players, seed=None, processes=None,
+                       chunksize=500):
+    """
+    DealStats over n_deals deals played on a pool of worker processes
+
+    Workers send back the stats of their chunk rather than its deals, the
+    totals are the same as DealStats().update(iter_deals(n_deals, players,
+    seed)).
+    """
+    seed = new_seed() if seed is None else seed
+    chunks = ((players, seed, start, min(chunksize, n_deals - start))
+              for start in xrange(0, n_deals, chunksize))
+    pool = multiprocessing.Pool(processes)
+    try:
+        stats = DealStats()
+        for chunk in pool.imap_unordered(_aggregate_chunk, chunks):
+            stats.merge(chunk)
+        return stats
+    finally:
+        pool.close()
+        pool.join()
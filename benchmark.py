@@ -0,0 +1,260 @@
+import argparse
+import json
+import platform
+import sys
+import timeit
+
+from whist import AI, CARDS, RANKS, SUITS, Game, Hand, Player, Trick, \
+    find_card_from_string
+from simulation import play_deal
+
+
+SEED = 2013             # Every case is built from the same deals
+THRESHOLD = 0.10        # Slowdown over the baseline that is a regression
+
+
+def new_players():
+    return [Player('Player %d' % (i + 1), AI()) for i in xrange(4)]
+
+
+def snapshot(game):
+    """
+    Copy of a game in the middle of a trick, with players of its own, and
+    the player whose turn it is
+    """
+    players = [Player(p.name, p.ai) for p in game.players]
+    for copy, player in zip(players, game.players):
+        copy.hand = Hand(mask=player.hand.mask)
+    copy = Game(players, verbose=False)
+    copy.dealer = game.dealer
+    copy.trump = game.trump
+    copy.mode = game.mode
+    copy.playing = game.playing
+    copy.trick = Trick()
+    for card, player in game.trick.played_cards:
+        copy.trick.play(card, players[game.players.index(player)])
+    return copy, players[game.playing]
+
+
+def positions(count):
+    """
+    count snapshots of a player about to play, taken from played deals
+    """
+    game = Game(new_players(), verbose=False, seed=SEED)
+    game.start()
+    found = []
+    while len(found) < count:
+        if not len(game.players[game.playing].hand):
+            game.collect()
+            game.start()
+        game.trick = Trick()
+        while len(game.trick.played_cards) < 4:
+            found.append(snapshot(game))
+            player = game.players[game.playing]
+            game.trick.play(player.play(game), player)
+            game.playing = (game.playing + 1) % 4
+        game.finish_trick()
+    return found[:count]
+
+
+def bench_trick_winning():
+    tricks = [(game.trick, game.trump.suit) for game, player in positions(400)
+              if game.trick.played_cards]
+
+    def run():
+        for trick, trump in tricks:
+            trick.winning(trump)
+    return run, len(tricks)
+
+
+def bench_trick_sort():
+    tricks = [(game.trick, game.trump.suit) for game, player in positions(400)
+              if game.trick.played_cards]
+
+    def run():
+        for trick, trump in tricks:
+            trick.sort(trump)
+    return run, len(tricks)
+
+
+def bench_trick_winning_cards():
+    cases = [(game.trick, player.hand, game.trump.suit)
+             for game, player in positions(400) if game.trick.played_cards]
+
+    def run():
+        for trick, hand, trump in cases:
+            trick.winning_cards(hand, trump)
+    return run, len(cases)
+
+
+def bench_player_sort():
+    players = [player for game, player in positions(400)]
+
+    def run():
+        for player in players:
+            player.sort()
+    return run, len(players)
+
+
+def bench_valid_cards():
+    cases = positions(400)
+
+    def run():
+        for game, player in cases:
+            game.valid_cards(player.hand)
+    return run, len(cases)
+
+
+def bench_ai_play():
+    """
+    Every play puts its card back, so each run sees the same positions
+    """
+    cases = positions(400)
+
+    def run():
+        for game, player in cases:
+            player.hand.append(player.ai.play(player, game))
+    return run, len(cases)
+
+
+def bench_find_card_from_string():
+    hands = [list(player.hand) for game, player in positions(100)]
+    cases = []
+    for hand in hands:
+        for card in hand[:2]:
+            cases.append((card.name, hand))
+            cases.append(('%s of %s' % (RANKS[card.rank], SUITS[card.suit]),
+                          hand))
+
+    def run():
+        for s, hand in cases:
+            find_card_from_string(s, hand)
+    return run, len(cases)
+
+
+def bench_deal():
+    """
+    Deck.shuffle, Deck.hef_af and Game.deal on a full deck
+    """
+    game = Game(new_players(), verbose=False, seed=SEED)
+    deals = 200
+
+    def run():
+        for i in xrange(deals):
+            for player in game.players:
+                player.hand = Hand()
+            game.deck.deck = list(CARDS)
+            game.deck.shuffle()
+            game.deck.hef_af()
+            game.deal()
+    return run, deals
+
+
+def bench_full_deal():
+    """
+    Dealing, bidding and playing out a deal with four standard AIs
+    """
+    game = Game(new_players(), verbose=False)
+    deals = 50
+
+    def run():
+        for i in xrange(deals):
+            play_deal(game, SEED, i)
+    return run, deals
+
+
+CASES = (
+    ('trick.winning', bench_trick_winning),
+    ('trick.sort', bench_trick_sort),
+    ('trick.winning_cards', bench_trick_winning_cards),
+    ('player.sort', bench_player_sort),
+    ('game.valid_cards', bench_valid_cards),
+    ('ai.play', bench_ai_play),
+    ('find_card_from_string', bench_find_card_from_string),
+    ('shuffle_and_deal', bench_deal),
+    ('full_deal', bench_full_deal),
+)
+
+
+def measure(bench, repeat=5, min_time=0.2):
+    """
+    Seconds per operation of a case, the best of repeat runs of at least
+    min_time seconds each
+    """
+    run, ops = bench()
+    run()
+    number = 1
+    while timeit.timeit(run, number=number) < min_time:
+        number *= 2
+    best = min(timeit.repeat(run, repeat=repeat, number=number))
+    return best / (number * ops)
+
+
+def run_cases(names=None, repeat=5):
+    results = {}
+    for name, bench in CASES:
+        if names and not any(n in name for n in names):
+            continue
+        results[name] = measure(bench, repeat)
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def compare(run, baseline, threshold=THRESHOLD):
+    """
+    (name, seconds, baseline seconds, ratio, regressed) for every case in
+    both runs
+    """
+    rows = []
+    for name, bench in CASES:
+        if name in run['results'] and name in baseline['results']:
+            now = run['results'][name]
+            before = baseline['results'][name]
+            ratio = now / before
+            rows.append((name, now, before, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Time the engine hot paths')
+    parser.add_argument('cases', nargs='*',
+                        help='only run cases whose name contains one of these')
+    parser.add_argument('-o', '--output', help='write the results to a file')
+    parser.add_argument('-b', '--baseline',
+                        help='compare with the results in a file')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-t', '--threshold', type=float, default=THRESHOLD,
+                        help='slowdown that is a regression (default 0.10)')
+    args = parser.parse_args(argv)
+
+    results = run_cases(args.cases, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if not args.baseline:
+        for name, bench in CASES:
+            if name in results['results']:
+                seconds = results['results'][name]
+                print('%-24s %10.2f us %12.0f/s' %
+                      (name, seconds * 1e6, 1 / seconds))
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = 0
+    for name, now, before, ratio, regressed in compare(results, baseline,
+                                                        args.threshold):
+        print('%-24s %10.2f us %10.2f us %+7.1f%%%s' %
+              (name, now * 1e6, before * 1e6, (ratio - 1) * 100,
+               '  REGRESSION' if regressed else ''))
+        regressions += regressed
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
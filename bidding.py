@@ -0,0 +1,118 @@
+import json
+import sys
+import warnings
+
+from whist import AI, SUIT_MASKS, Player, data_path, popcount
+
+
+TABLE_PATH = data_path('bidding.json')
+MIN_SAMPLES = 20                    # Below this, use the coarse signature
+HONOURS = ((12, 4), (11, 3), (10, 2), (9, 1))   # Ace, king, queen, jack
+
+_table = None
+
+
+def signature(hand, trump):
+    """
+    Canonical signature of a hand (a card mask) for the given trump suit
+
+    Trump length, trump honour points (A=4, K=3, Q=2, J=1), length of the
+    longest and shortest side suit, and the number of side aces and kings.
+    """
+    trumps = (hand & SUIT_MASKS[trump]) >> (13 * trump)
+    points = sum(value for rank, value in HONOURS if trumps >> rank & 1)
+    lengths = []
+    aces = kings = 0
+    for suit in xrange(4):
+        if suit == trump:
+            continue
+        cards = (hand & SUIT_MASKS[suit]) >> (13 * suit)
+        lengths.append(popcount(cards))
+        aces += cards >> 12 & 1
+        kings += cards >> 11 & 1
+    return (popcount(trumps), points, max(lengths), min(lengths), aces,
+            kings)
+
+
+def coarse_signature(fine):
+    """
+    Trump length, trump honour points and side aces of a signature
+    """
+    return fine[0], fine[1], fine[4]
+
+
+def load_table(path=TABLE_PATH):
+    """
+    The precomputed table, read from disk on first use
+
+    Without the file it warns and the table is empty, so the AI takes the
+    first possible bid until the table is built.
+    """
+    global _table
+    if _table is None:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except IOError as e:
+            warnings.warn('no bidding table, build it with bidding.py: %s'
+                          % e, RuntimeWarning)
+            data = {}
+        _table = dict(
+            (level, dict((tuple(int(x) for x in key.split(',')), tuple(value))
+                         for key, value in data.get(level, {}).iteritems()))
+            for level in ('fine', 'coarse'))
+    return _table
+
+
+def expected_tricks(hand, trump):
+    """
+    Tricks a hand is expected to take with this trump suit, None when the
+    table has nothing for it
+    """
+    table = load_table()
+    fine = signature(hand, trump)
+    entry = table['fine'].get(fine)
+    if entry and entry[1] >= MIN_SAMPLES:
+        return entry[0]
+    entry = table['coarse'].get(coarse_signature(fine))
+    if entry:
+        return entry[0]
+    return None
+
+
+def build_table(n_deals, seed=None, processes=None):
+    """
+    Average tricks per signature over n_deals simulated deals
+
+    Every seat of every deal is one sample: its hand as dealt against the
+    tricks it took playing the standard AI.
+    """
+    from simulation import parallel_simulate
+
+    players = [Player('Player %d' % (i + 1), AI()) for i in xrange(4)]
+    totals = {'fine': {}, 'coarse': {}}
+    for result in parallel_simulate(n_deals, players, seed, processes):
+        for hand, tricks in zip(result.hands, result.tricks):
+            fine = signature(hand, result.trump.suit)
+            for level, key in (('fine', fine),
+                               ('coarse', coarse_signature(fine))):
+                total, count = totals[level].get(key, (0, 0))
+                totals[level][key] = (total + tricks, count + 1)
+    return dict(
+        (level, dict((key, (float(total) / count, count))
+                     for key, (total, count) in entries.iteritems()))
+        for level, entries in totals.iteritems())
+
+
+def save_table(table, path=TABLE_PATH):
+    data = dict(
+        (level, dict((','.join(map(str, key)), [round(mean, 3), count])
+                     for key, (mean, count) in entries.iteritems()))
+        for level, entries in table.iteritems())
+    with open(path, 'w') as f:
+        json.dump(data, f, sort_keys=True, separators=(',', ':'))
+
+
+if __name__ == '__main__':
+    n_deals = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    save_table(build_table(n_deals, seed=0))
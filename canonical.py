@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict
+
+from whist import CARDS
+
+
+def suit_permutation(masks, trump):
+    """
+    Relabeling of the suits that puts masks in canonical form
+
+    The non-trump suits are sorted on what every mask holds in them, so
+    positions that only differ by a permutation of those suits get the same
+    relabeling result. Returns perm, with perm[suit] the suit it becomes.
+    """
+    others = [suit for suit in xrange(4) if suit != trump]
+    ordered = sorted(others, key=lambda suit: tuple(
+        mask >> (13 * suit) & 0x1fff for mask in masks))
+    perm = range(4)
+    for slot, suit in zip(others, ordered):
+        perm[suit] = slot
+    return perm
+
+
+def permute(mask, perm):
+    return (mask & 0x1fff) << (13 * perm[0]) | \
+        (mask >> 13 & 0x1fff) << (13 * perm[1]) | \
+        (mask >> 26 & 0x1fff) << (13 * perm[2]) | \
+        (mask >> 39 & 0x1fff) << (13 * perm[3])
+
+
+def permute_card(card, perm):
+    return CARDS[13 * perm[card.suit] + card.rank]
+
+
+def canonical_hands(hands, trump, trick=()):
+    """
+    Hands (card masks by seat) and trick ((card, seat) pairs) with their
+    non-trump suits relabeled to canonical form, and the permutation used
+    """
+    perm = suit_permutation(list(hands) + [card.mask for card, seat in trick],
+                            trump)
+    return (tuple(permute(hand, perm) for hand in hands),
+            tuple((permute_card(card, perm), seat) for card, seat in trick),
+            perm)
+
+
+class LRUCache(object):
+    """
+    Holds at most maxsize results, dropping the least recently used first
+
+    hits, misses and evictions are counted so the cache can be sized. The
+    cache can be shared between threads, such as the server's thread pool.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.entries[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = value
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+        }
+
+    def __repr__(self):
+        return '<LRUCache: %d/%d, %d hits, %d misses, %d evictions>' % (
+            len(self.entries), self.maxsize, self.hits, self.misses,
+            self.evictions)
+
+
+# Cache the evaluators share by default, keys start with the evaluator name
+shared = LRUCache()
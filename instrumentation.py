@@ -0,0 +1,168 @@
+import sys
+import time
+
+
+def _monotonic():
+    """
+    A monotonic clock in seconds for Pythons without time.monotonic, uses
+    clock_gettime on Linux and falls back on time.time elsewhere
+    """
+    if not sys.platform.startswith('linux'):
+        return time.time
+    import ctypes
+    import ctypes.util
+
+    class timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    try:
+        lib = ctypes.CDLL(ctypes.util.find_library('rt') or
+                          ctypes.util.find_library('c'))
+        clock_gettime = lib.clock_gettime
+    except (OSError, AttributeError):
+        return time.time
+    CLOCK_MONOTONIC = 1
+    ts = timespec()
+    ref = ctypes.byref(ts)
+
+    def monotonic():
+        clock_gettime(CLOCK_MONOTONIC, ref)
+        return ts.tv_sec + ts.tv_nsec * 1e-9
+    return monotonic
+
+
+monotonic = getattr(time, 'monotonic', None) or _monotonic()
+
+
+class Observer(object):
+    """
+    Receives the events of a Game it is attached to with Game.observers
+
+    Every event gets the game and the monotonic time it fired at. Decisions
+    and rule evaluations also get the seconds they took as elapsed.
+    """
+
+    def deal_start(self, game, t):
+        pass
+
+    def bid(self, game, t, player, bid, elapsed):
+        pass
+
+    def card_played(self, game, t, player, card, elapsed):
+        pass
+
+    def trick_won(self, game, t, player, trick, elapsed):
+        pass
+
+    def post_game(self, game, t, winning_side, elapsed):
+        pass
+
+    def deal_end(self, game, t):
+        pass
+
+
+class Histogram(object):
+    """
+    Latencies bucketed by powers of two microseconds
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        bucket = int(seconds * 1e6).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        for bucket, count in other.buckets.iteritems():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """
+        Upper bound in seconds of the bucket holding the q-th percentile
+        """
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen * 100.0 >= q * self.count:
+                return min((1 << bucket) * 1e-6, self.max)
+        return 0.0
+
+    def __repr__(self):
+        return '<Histogram: %d, mean %.1f us>' % (self.count,
+                                                  self.mean() * 1e6)
+
+
+class Collector(Observer):
+    """
+    Latency histograms per phase of the deal and per AI type
+
+    The phases are the whole deal, bid and play decisions, trick resolution
+    and scoring; other is what is left of a deal after those, mostly output
+    and bookkeeping.
+    """
+    PHASES = ('deal', 'bid', 'play', 'trick', 'score', 'other')
+
+    def __init__(self):
+        self.phases = dict((phase, Histogram()) for phase in self.PHASES)
+        self.decisions = {}     # (AI type name, 'bid' or 'play') -> Histogram
+        self.started = None
+        self.accounted = 0.0
+
+    def decision(self, player, kind, elapsed):
+        key = (type(player.ai).__name__, kind)
+        if key not in self.decisions:
+            self.decisions[key] = Histogram()
+        self.decisions[key].add(elapsed)
+        self.phases[kind].add(elapsed)
+        self.accounted += elapsed
+
+    def deal_start(self, game, t):
+        self.started = t
+        self.accounted = 0.0
+
+    def bid(self, game, t, player, bid, elapsed):
+        self.decision(player, 'bid', elapsed)
+
+    def card_played(self, game, t, player, card, elapsed):
+        self.decision(player, 'play', elapsed)
+
+    def trick_won(self, game, t, player, trick, elapsed):
+        self.phases['trick'].add(elapsed)
+        self.accounted += elapsed
+
+    def post_game(self, game, t, winning_side, elapsed):
+        self.phases['score'].add(elapsed)
+        self.accounted += elapsed
+
+    def deal_end(self, game, t):
+        if self.started is None:
+            return
+        self.phases['deal'].add(t - self.started)
+        self.phases['other'].add(max(t - self.started - self.accounted, 0))
+        self.started = None
+
+    def report(self):
+        lines = ['%-24s %8s %10s %10s %10s %10s' %
+                 ('', 'count', 'mean us', 'p50 us', 'p99 us', 'total s')]
+        rows = [(phase, self.phases[phase]) for phase in self.PHASES]
+        rows += [('%s.%s' % key, self.decisions[key])
+                 for key in sorted(self.decisions)]
+        for name, histogram in rows:
+            lines.append('%-24s %8d %10.1f %10.1f %10.1f %10.3f' % (
+                name, histogram.count, histogram.mean() * 1e6,
+                histogram.percentile(50) * 1e6,
+                histogram.percentile(99) * 1e6, histogram.total))
+        return '\n'.join(lines)
@@ -0,0 +1,216 @@
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+import Queue
+
+from instrumentation import Observer
+from whist import GameMode
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS deals (
+    session TEXT NOT NULL,
+    table_id INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    finished REAL NOT NULL,
+    dealer INTEGER NOT NULL,
+    trump TEXT NOT NULL,
+    contract TEXT NOT NULL,
+    winning_side TEXT NOT NULL,
+    offensive_tricks INTEGER NOT NULL,
+    PRIMARY KEY (session, table_id, number)
+);
+CREATE TABLE IF NOT EXISTS seats (
+    session TEXT NOT NULL,
+    table_id INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    seat INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    bid TEXT NOT NULL,
+    offensive INTEGER NOT NULL,
+    tricks INTEGER NOT NULL,
+    won INTEGER NOT NULL,
+    PRIMARY KEY (session, table_id, number, seat)
+);
+CREATE INDEX IF NOT EXISTS seats_player
+    ON seats (player, table_id, won, tricks);
+CREATE INDEX IF NOT EXISTS deals_contract ON deals (contract, winning_side);
+'''
+INSERT_DEAL = 'INSERT INTO deals VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+INSERT_SEAT = 'INSERT INTO seats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+
+
+def connect(path):
+    """
+    Connection to a ledger database, creating its tables if needed
+    """
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def contract_of(bids):
+    """
+    The bids that made up the offensive side, 'pass' when all passed
+    """
+    return '+'.join(bid for bid in bids if bid != 'pass') or 'pass'
+
+
+class Ledger(Observer):
+    """
+    Keeps running scores over the deals of a session and stores every deal
+    in a SQLite database at path
+
+    Attach it to games with Game.observers, their deals are stored as
+    table 0. Games of a server with several tables attach the observer of
+    ledger.table(id) instead, so their deals and scores are kept apart.
+    Deals are queued and written by a background thread, batch_size deals
+    or flush_interval seconds' worth per transaction, so games never wait
+    on the disk. Close the ledger to write what is still queued. A batch
+    that fails to write is reported and counted in lost, and the writer
+    goes on with the next. Deals of an existing session are numbered on
+    from the last deal of their table.
+    """
+
+    def __init__(self, path, session=None, batch_size=100,
+                 flush_interval=1.0):
+        self.path = path
+        self.session = session or uuid.uuid4().hex
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.deals = 0
+        self.scores = {}        # (table, seat) -> [name, deals, won, tricks]
+        self.lost = 0           # Deals that failed to be written
+        self.queue = Queue.Queue()
+        connection = connect(path)
+        self.numbers = dict(connection.execute(
+            'SELECT table_id, MAX(number) FROM deals WHERE session = ? '
+            'GROUP BY table_id', (self.session,)))
+        connection.close()
+        self.writer = threading.Thread(target=self.write)
+        self.writer.daemon = True
+        self.writer.start()
+
+    def table(self, table):
+        """
+        Observer that stores the deals of a game as those of table
+        """
+        return TableLedger(self, table)
+
+    def post_game(self, game, t, winning_side, elapsed):
+        self.record(0, game, winning_side)
+
+    def record(self, table, game, winning_side):
+        self.deals += 1
+        number = self.numbers[table] = self.numbers.get(table, 0) + 1
+        offensive = game.mode.offensive
+        bids = [None] * 4
+        for i, bid in enumerate(game.bids):
+            bids[(game.dealer + 1 + i) % 4] = bid
+        seats = []
+        for seat, player in enumerate(game.players):
+            attacking = player in offensive
+            won = attacking == (winning_side == GameMode.OFFENSIVE)
+            tricks = player.trick_count()
+            score = self.scores.setdefault((table, seat), [None, 0, 0, 0])
+            score[0] = player.name
+            score[1] += 1
+            score[2] += won
+            score[3] += tricks
+            seats.append((self.session, table, number, seat, player.name,
+                          bids[seat], int(attacking), tricks, int(won)))
+        deal = (self.session, table, number, time.time(), game.dealer,
+                game.trump.name, contract_of(game.bids), winning_side,
+                sum(p.trick_count() for p in offensive))
+        self.queue.put((deal, seats))
+
+    def write(self):
+        """
+        Writer thread: commits queued deals in batches until close
+        """
+        connection = connect(self.path)
+        done = False
+        while not done:
+            batch = []
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(
+                        timeout=max(deadline - time.time(), 0))
+                except Queue.Empty:
+                    break
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    with connection:
+                        connection.executemany(
+                            INSERT_DEAL, [deal for deal, seats in batch])
+                        connection.executemany(
+                            INSERT_SEAT, [seat for deal, seats in batch
+                                          for seat in seats])
+                except sqlite3.Error:
+                    traceback.print_exc()
+                    self.lost += len(batch)
+        connection.close()
+
+    def standings(self):
+        """
+        (table, seat, name, deals, won, tricks) of every seat, most deals
+        won first, the name is the seat's latest player
+        """
+        return sorted((key + tuple(score)
+                       for key, score in self.scores.iteritems()),
+                      key=lambda row: (-row[4], row[0], row[1]))
+
+    def close(self):
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TableLedger(Observer):
+    """
+    Stores the deals of the games it is attached to in ledger as those of
+    one table
+    """
+
+    def __init__(self, ledger, table):
+        self.ledger = ledger
+        self.table = table
+
+    def post_game(self, game, t, winning_side, elapsed):
+        self.ledger.record(self.table, game, winning_side)
+
+
+def player_record(connection, player, table=None):
+    """
+    (deals, won, tricks) of a player over every session, at one table
+    only when table is given
+    """
+    query = ('SELECT COUNT(*), COALESCE(SUM(won), 0), '
+             'COALESCE(SUM(tricks), 0) FROM seats WHERE player = ?')
+    if table is None:
+        return connection.execute(query, (player,)).fetchone()
+    return connection.execute(query + ' AND table_id = ?',
+                              (player, table)).fetchone()
+
+
+def contract_record(connection, contract):
+    """
+    (deals, offensive wins) of a contract over every session
+    """
+    return connection.execute(
+        'SELECT COUNT(*), COALESCE(SUM(winning_side = ?), 0) '
+        'FROM deals WHERE contract = ?',
+        (GameMode.OFFENSIVE, contract)).fetchone()
@@ -0,0 +1,172 @@
+import random
+import time
+
+from whist import AI, Game, Hand, Player, Trick, cards_of, mask_of
+from solver import Solver
+import canonical
+
+
+ALL_CARDS = (1 << 52) - 1
+
+
+class MonteCarloAI(AI):
+    """
+    Plays the card that does best over random layouts of the unseen cards
+
+    Every layout agrees with the cards played so far, the suits players have
+    shown out of and the trump card the dealer still holds. Cards are scored
+    with the double-dummy solver once a hand is down to solver_cards cards,
+    and with rollouts of the standard AI before that. Sampling stops after
+    samples layouts or time_limit seconds, whichever comes first. Solver
+    results go to cache, shared with other evaluators by default, and the
+    solver looks endgames up in tablebase when one is given and the _solver
+    extension is not built.
+    """
+
+    expensive = True        # Servers run it off their event loop
+
+    def __init__(self, samples=30, time_limit=None, solver_cards=6,
+                 rng=None, cache=canonical.shared, tablebase=None):
+        self.samples = samples
+        self.cache = cache
+        self.tablebase = tablebase
+        self.time_limit = time_limit
+        self.solver_cards = solver_cards
+        self.rng = rng or random.Random()
+        self.rollout_ai = AI()
+
+    def play(self, player, game):
+        legal = cards_of(mask_of(player.valid_cards(game)))
+        if len(legal) == 1:
+            return player.hand.take(legal[0])
+
+        start = time.time()
+        seat = game.players.index(player)
+        offensive = [game.players.index(p) for p in game.mode.offensive]
+        scores = [0] * len(legal)
+        for i in xrange(self.samples):
+            if i > 0 and self.time_limit is not None and \
+                    time.time() - start >= self.time_limit:
+                break
+            hands = self.layout(player, game)
+            if len(player.hand) <= self.solver_cards:
+                solver = Solver(game.trump.suit, offensive, self.cache,
+                                self.tablebase)
+                for j, card in enumerate(legal):
+                    scores[j] += self.solve(solver, hands, game, seat, card)
+            else:
+                for j, card in enumerate(legal):
+                    scores[j] += self.rollout(hands, game, seat, card,
+                                              offensive)
+
+        pick = max if seat in offensive else min
+        best = pick(xrange(len(legal)), key=lambda j: scores[j])
+        return player.hand.take(legal[best])
+
+    def layout(self, player, game):
+        """
+        Random hands for every seat that agree with what player has seen
+        """
+        players = game.players
+        seat = players.index(player)
+        played = game.knowledge.played
+        voids = game.knowledge.voids
+
+        hands = [0] * 4
+        hands[seat] = player.hand.mask
+        sizes = [len(other.hand) for other in players]
+        sizes[seat] = 0
+        unseen = ALL_CARDS & ~played & ~player.hand.mask
+        if unseen & game.trump.mask:
+            hands[game.dealer] |= game.trump.mask
+            sizes[game.dealer] -= 1
+            unseen ^= game.trump.mask
+
+        cards = cards_of(unseen)
+        for attempt in xrange(100):
+            dealt = self.deal(cards, hands, sizes, voids)
+            if dealt:
+                return dealt
+        return self.deal_constrained_first(cards, hands, sizes, voids)
+
+    def deal(self, cards, hands, sizes, voids):
+        """
+        Give every card to a seat that can hold it, chosen in proportion to
+        the room left in its hand, None when that runs into a dead end
+        """
+        hands = list(hands)
+        sizes = list(sizes)
+        self.rng.shuffle(cards)
+        for card in cards:
+            room = [sizes[seat] if not voids[seat] & card.mask else 0
+                    for seat in xrange(4)]
+            total = sum(room)
+            if not total:
+                return None
+            pick = self.rng.randrange(total)
+            seat = 0
+            while pick >= room[seat]:
+                pick -= room[seat]
+                seat += 1
+            hands[seat] |= card.mask
+            sizes[seat] -= 1
+        return hands
+
+    def deal_constrained_first(self, cards, hands, sizes, voids):
+        """
+        Fill the seats that can hold the fewest of the cards first, cards
+        that fit nowhere then go to the seats with room left regardless of
+        their voids, so every hand still gets its size
+        """
+        hands = list(hands)
+        sizes = list(sizes)
+        left = mask_of(cards)
+        order = sorted(xrange(4), key=lambda seat: len(cards_of(
+            left & ~voids[seat])) if sizes[seat] else 52)
+        for seat in order:
+            if not sizes[seat]:
+                continue
+            options = cards_of(left & ~voids[seat])
+            chosen = self.rng.sample(options, min(sizes[seat], len(options)))
+            hands[seat] |= mask_of(chosen)
+            sizes[seat] -= len(chosen)
+            left &= ~mask_of(chosen)
+        rest = cards_of(left)
+        self.rng.shuffle(rest)
+        for seat in xrange(4):
+            hands[seat] |= mask_of(rest[:sizes[seat]])
+            rest = rest[sizes[seat]:]
+        return hands
+
+    def solve(self, solver, hands, game, seat, card):
+        """
+        Offensive tricks still to come after seat plays card, double-dummy
+        """
+        hands = list(hands)
+        hands[seat] ^= card.mask
+        trick = [(c, game.players.index(p))
+                 for c, p in game.trick.played_cards] + [(card, seat)]
+        return solver.solve(hands, trick[0][1], trick)
+
+    def rollout(self, hands, game, seat, card, offensive):
+        """
+        Offensive tricks still to come after seat plays card, when everyone
+        plays the rest of the deal with the standard AI
+        """
+        players = [Player(p.name, self.rollout_ai) for p in game.players]
+        for other, hand in zip(players, hands):
+            other.hand = Hand(mask=hand)
+        players[seat].hand.remove(card)
+
+        sim = Game(players, verbose=False)
+        sim.dealer = game.dealer
+        sim.trump = game.trump
+        sim.trick = Trick()
+        for c, p in game.trick.played_cards:
+            sim.trick.play(c, players[game.players.index(p)])
+        sim.trick.play(card, players[seat])
+        sim.playing = (seat + 1) % 4
+        sim.finish_trick()
+        while len(players[sim.playing].hand) > 0:
+            sim.round()
+        return sum(players[s].trick_count() for s in offensive)
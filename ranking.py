@@ -0,0 +1,137 @@
+from whist import CARDS, Game, cards_of, mask_of
+from simulation import finish_deal, reset
+
+
+PACKETS = (4, 4, 5)
+
+
+def _binomials(n):
+    table = [[0] * (n + 1) for i in xrange(n + 1)]
+    for i in xrange(n + 1):
+        table[i][0] = 1
+        for j in xrange(1, i + 1):
+            table[i][j] = table[i - 1][j - 1] + table[i - 1][j]
+    return table
+
+
+BINOMIAL = _binomials(52)
+# Ways to give 13 cards to each seat, times the dealer and the position of
+# the trump card among the dealer's cards
+LAYOUTS = BINOMIAL[52][13] * BINOMIAL[39][13] * BINOMIAL[26][13]
+DEALS = LAYOUTS * 4 * 13
+
+
+def deal_positions(dealer):
+    """
+    Deck positions every seat receives from Game.deal, in the order they
+    are dealt
+    """
+    positions = [[] for seat in xrange(4)]
+    position = 0
+    for size in PACKETS:
+        for i in xrange(4):
+            seat = (dealer + 1 + i) % 4
+            positions[seat] += range(position, position + size)
+            position += size
+    return positions
+
+
+def rank_hands(hands, dealer, trump):
+    """
+    Number of a deal, hands are card masks by seat and trump is the
+    dealer's trump card
+    """
+    remaining = range(52)
+    number = 0
+    for seat in xrange(3):
+        number *= BINOMIAL[len(remaining)][13]
+        chosen = [i for i, card in enumerate(remaining)
+                  if hands[seat] >> card & 1]
+        number += sum(BINOMIAL[position][k + 1]
+                      for k, position in enumerate(chosen))
+        remaining = [card for card in remaining
+                     if not hands[seat] >> card & 1]
+    position = cards_of(hands[dealer]).index(trump)
+    return (dealer * 13 + position) * LAYOUTS + number
+
+
+def rank(game):
+    """
+    Number of the deal of a game, taken from the deck as it was dealt so it
+    can be ranked during or after play
+    """
+    deck = game.deal_order
+    hands = [mask_of(deck[p] for p in positions)
+             for positions in deal_positions(game.dealer)]
+    return rank_hands(hands, game.dealer, game.trump)
+
+
+def unrank(number):
+    """
+    (hands as card masks by seat, dealer, trump card) of a deal number
+    """
+    if not 0 <= number < DEALS:
+        raise ValueError('deal number out of range')
+    number, layout = divmod(number, LAYOUTS)
+    dealer, position = map(int, divmod(number, 13))
+    remaining = range(52)
+    hands = [0] * 4
+    for seat in xrange(3):
+        layouts = 1
+        for left in xrange(len(remaining) - 13, 13, -13):
+            layouts *= BINOMIAL[left][13]
+        combination, layout = divmod(layout, layouts)
+        n = len(remaining)
+        for k in xrange(13, 0, -1):
+            n -= 1
+            while BINOMIAL[n][k] > combination:
+                n -= 1
+            combination -= BINOMIAL[n][k]
+            hands[seat] |= 1 << remaining[n]
+        remaining = [card for card in remaining
+                     if not hands[seat] >> card & 1]
+    hands[3] = mask_of(CARDS[card] for card in remaining)
+    return hands, dealer, cards_of(hands[dealer])[position]
+
+
+def deck(number):
+    """
+    Deck order from which Game.deal deals deal number, and its dealer
+    """
+    hands, dealer, trump = unrank(number)
+    order = [None] * 52
+    for seat, positions in enumerate(deal_positions(dealer)):
+        cards = cards_of(hands[seat])
+        if seat == dealer:
+            cards.remove(trump)
+            cards.append(trump)     # The dealer's last card is trump
+        for position, card in zip(positions, cards):
+            order[position] = card
+    return order, dealer
+
+
+def deal(game, number):
+    """
+    Deal deal number to game, with the dealer and trump it encodes
+    """
+    order, dealer = deck(number)
+    reset(game, dealer)
+    game.deck.deck = order
+    game.deal()
+
+
+def iter_ranked_deals(start, stop, players):
+    """
+    Play deals number start .. stop - 1 without any output, yields their
+    DealResults
+
+    Deals are numbered independently of any random seed, so ranges of
+    numbers can be handed out to machines that need no coordination.
+    """
+    game = Game(players, verbose=False)
+    number = start
+    while number < stop:        # Deal numbers overflow xrange
+        deal(game, number)
+        game.bidding()
+        yield finish_deal(game)
+        number += 1
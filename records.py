@@ -0,0 +1,183 @@
+import mmap
+import os
+import struct
+
+from whist import BIDS, CARDS, GameMode, Trick
+
+
+MAGIC = 'WHST'
+VERSION = 1
+HEADER = struct.Struct('<4sBxH')
+# dealer, deal order, trump, bid per seat, plays, winning side, offensive
+# tricks; cards are stored as their index, bids as their index in BIDS
+RECORD = struct.Struct('<B52sB4s52sBB')
+SIDES = (GameMode.OFFENSIVE, GameMode.DEFENSIVE)
+
+AT_DEALER, AT_DECK, AT_TRUMP, AT_BIDS, AT_PLAYS, AT_SIDE, AT_TRICKS = \
+    0, 1, 53, 54, 58, 110, 111  # Field offsets within a record
+
+
+def pack(game):
+    """
+    Record of a game that has been played to the end and scored
+    """
+    bids = [0] * 4
+    for i, bid in enumerate(game.bids):
+        bids[(game.dealer + 1 + i) % 4] = BIDS.index(bid)
+    plays = [card.index for trick in game.tricks
+             for card, player in trick.played_cards]
+    offensive_tricks = sum(p.trick_count() for p in game.mode.offensive)
+    return RECORD.pack(
+        game.dealer,
+        ''.join(chr(card.index) for card in game.deal_order),
+        game.trump.index,
+        ''.join(map(chr, bids)),
+        ''.join(map(chr, plays)),
+        SIDES.index(game.mode.winning_side),
+        offensive_tricks)
+
+
+class RecordWriter(object):
+    """
+    Appends game records to a file, writing the header if it is new
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+
+    def write(self, game):
+        self.file.write(pack(game))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Record(object):
+    """
+    View on one record of a mapped file, fields are decoded when read
+    """
+    __slots__ = ('buf', 'offset')
+
+    def __init__(self, buf, offset):
+        self.buf = buf
+        self.offset = offset
+
+    def field(self, at):
+        return ord(self.buf[self.offset + at])
+
+    def fields(self, at, count):
+        return struct.unpack_from('<%dB' % count, self.buf, self.offset + at)
+
+    @property
+    def dealer(self):
+        return self.field(AT_DEALER)
+
+    @property
+    def deck(self):
+        return [CARDS[i] for i in self.fields(AT_DECK, 52)]
+
+    @property
+    def trump(self):
+        return CARDS[self.field(AT_TRUMP)]
+
+    @property
+    def bids(self):
+        """
+        Bids by seat
+        """
+        return tuple(BIDS[i] for i in self.fields(AT_BIDS, 4))
+
+    @property
+    def plays(self):
+        return [CARDS[i] for i in self.fields(AT_PLAYS, 52)]
+
+    @property
+    def winning_side(self):
+        return SIDES[self.field(AT_SIDE)]
+
+    @property
+    def offensive_tricks(self):
+        return self.field(AT_TRICKS)
+
+    @property
+    def offensive(self):
+        return tuple(seat for seat, bid in enumerate(self.bids)
+                     if bid != 'pass')
+
+    def raw(self):
+        return buffer(self.buf, self.offset, RECORD.size)
+
+    def tricks(self):
+        """
+        Replay the plays, a list of (cards, leader, winner) per trick
+        """
+        trump = self.trump.suit
+        plays = self.plays
+        leader = (self.dealer + 1) % 4
+        tricks = []
+        for i in xrange(0, 52, 4):
+            trick = Trick()
+            for j, card in enumerate(plays[i:i + 4]):
+                trick.play(card, (leader + j) % 4)
+            winner = trick.winning(trump)[1]
+            tricks.append((plays[i:i + 4], leader, winner))
+            leader = winner
+        return tricks
+
+    def __repr__(self):
+        return '<Record: dealer %d, trump %s, %s>' % (
+            self.dealer, self.trump, self.winning_side)
+
+
+class RecordReader(object):
+    """
+    Memory maps a file of records, records are read in place
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size < HEADER.size:
+            self.file.close()
+            raise ValueError('%s is not a record file' % path)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION or \
+                record_size != RECORD.size:
+            self.close()
+            raise ValueError('%s is not a version %d record file' %
+                             (path, VERSION))
+        # A record being appended while we map the file is left out
+        self.count = (size - HEADER.size) / RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError('record index out of range')
+        return Record(self.map, HEADER.size + i * RECORD.size)
+
+    def __iter__(self):
+        for i in xrange(self.count):
+            yield Record(self.map, HEADER.size + i * RECORD.size)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,83 @@
+import hashlib
+import operator
+import os
+import struct
+
+
+BLOCK = 64              # Bytes of output per counter value
+_counter = struct.Struct('<Q')
+_words = {}             # Number of 32-bit words -> their struct
+_sha512 = hashlib.sha512
+_mod = operator.mod
+
+
+def new_seed():
+    return _counter.unpack(os.urandom(8))[0]
+
+
+class CounterRandom(object):
+    """
+    Counter-based random numbers: block n of a stream is the SHA-512 of its
+    key and n
+
+    The key comes from a seed and a stream number, so every table or worker
+    gets a stream of its own from one seed and is set up without the cost
+    of seeding a Mersenne Twister. jumpahead skips any number of blocks at
+    no cost. Implements the parts of random.Random that Deck and Game use.
+    """
+
+    def __init__(self, seed=None, stream=0):
+        self.seed(seed, stream)
+
+    def seed(self, seed=None, stream=0):
+        seed = new_seed() if seed is None else seed
+        self.key = '%x:%x:' % (seed, stream)
+        self.counter = 0
+
+    def randbytes(self, count):
+        """
+        Next count bytes of the stream, always starting on a fresh block
+        """
+        start = self.counter
+        self.counter += (count + BLOCK - 1) / BLOCK
+        key, pack = self.key, _counter.pack
+        return ''.join([_sha512(key + pack(n)).digest()
+                        for n in xrange(start, self.counter)])[:count]
+
+    def next(self):
+        return _counter.unpack(self.randbytes(8))[0]
+
+    def jumpahead(self, n):
+        self.counter += n
+
+    def random(self):
+        return (self.next() >> 11) * (1.0 / (1 << 53))
+
+    def randrange(self, start, stop=None):
+        if stop is None:
+            start, stop = 0, start
+        return start + self.next() % (stop - start)
+
+    def shuffle(self, cards):
+        """
+        Fisher-Yates shuffle in place with all swaps drawn at once, one
+        32-bit number per swap (the bias of taking them modulo at most 52 is
+        below 1e-8)
+        """
+        n = len(cards)
+        if n < 2:
+            return
+        words = _words.get(n - 1)
+        if words is None:
+            words = _words[n - 1] = struct.Struct('<%dI' % (n - 1))
+        i = n - 1
+        for j in map(_mod, words.unpack(self.randbytes(words.size)),
+                     xrange(n, 1, -1)):
+            cards[i], cards[j] = cards[j], cards[i]
+            i -= 1
+
+    def getstate(self):
+        return self.key, self.counter
+
+    def setstate(self, state):
+        self.key, self.counter = state
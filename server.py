@@ -0,0 +1,551 @@
+import argparse
+import asynchat
+import asyncore
+import collections
+import itertools
+import json
+import socket
+import sys
+import traceback
+import Queue
+from multiprocessing.pool import ThreadPool
+
+from whist import AI, Game, Player
+from instrumentation import Observer
+from ledger import Ledger
+from spectators import Publisher
+
+
+BUDGET = 64         # Decisions a table makes before other tables get a turn
+SEND_BACKLOG = 32   # Messages queued on a spectator's socket at most
+
+
+class SeatAI(object):
+    """
+    Makes the decision the server has prepared for the seat
+    """
+
+    def __init__(self):
+        self.decision = None
+
+    def play(self, player, game):
+        card, self.decision = self.decision, None
+        return player.hand.take(card)
+
+    def bid(self, player, game):
+        bid, self.decision = self.decision, None
+        return bid
+
+
+class RemoteSeat(SeatAI):
+    """
+    A seat played by a network client
+    """
+
+    def __init__(self, connection):
+        SeatAI.__init__(self)
+        self.connection = connection
+
+
+class OffloadedAI(SeatAI):
+    """
+    Runs an expensive AI on the server's thread pool
+
+    The AI plays by taking its card from the hand, the card is put back so
+    that the table takes it again when it resumes. When the AI fails the
+    standard AI decides instead, so the table never waits on it forever.
+    """
+
+    def __init__(self, ai):
+        SeatAI.__init__(self)
+        self.ai = ai
+
+    def decide(self, player, game, kind):
+        try:
+            return self.ask(self.ai, player, game, kind)
+        except Exception:
+            traceback.print_exc()
+            return self.ask(AI(), player, game, kind)
+
+    def ask(self, ai, player, game, kind):
+        if kind == 'bid':
+            return ai.bid(player, game)
+        card = ai.play(player, game)
+        player.hand.append(card)
+        return card
+
+
+class TableObserver(Observer):
+    """
+    Tells the clients at a table what happens at it
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def seat(self, game, player):
+        return game.players.index(player)
+
+    def bid(self, game, t, player, bid, elapsed):
+        self.table.broadcast(type='bid', seat=self.seat(game, player),
+                             bid=bid)
+
+    def card_played(self, game, t, player, card, elapsed):
+        self.table.broadcast(type='played', seat=self.seat(game, player),
+                             card=card.name)
+
+    def trick_won(self, game, t, player, trick, elapsed):
+        self.table.broadcast(type='trick', seat=self.seat(game, player))
+
+    def post_game(self, game, t, winning_side, elapsed):
+        self.table.broadcast(
+            type='result', winning_side=winning_side,
+            offensive=[self.seat(game, p) for p in game.mode.offensive],
+            tricks=[p.trick_count() for p in game.players])
+
+
+class Table(object):
+    """
+    A game played one decision at a time by the server's event loop
+
+    Seats are AIs or left open (None) for clients to join. The table deals
+    once every open seat is taken, and keeps dealing until deals deals are
+    played, or forever if deals is None.
+    """
+
+    def __init__(self, server, id, ais, deals=None):
+        self.server = server
+        self.id = id
+        self.deals = deals
+        self.played = 0
+        players = []
+        for seat, ai in enumerate(ais):
+            if ai is not None and getattr(ai, 'expensive', False):
+                ai = OffloadedAI(ai)
+            players.append(Player('Player %d' % (seat + 1), ai))
+        observers = [TableObserver(self)]
+        if server.ledger is not None:
+            observers.append(server.ledger.table(id))
+        self.game = Game(players, verbose=False, observers=observers)
+        self.spectators = Publisher(self.game)
+        self.turns = None
+        self.waiting = None     # Seat whose decision the table waits for
+        self.kind = None        # and whether it is a 'bid' or a 'play'
+        self.closed = False
+
+    def open_seats(self):
+        return [seat for seat, player in enumerate(self.game.players)
+                if player.ai is None]
+
+    def sit(self, connection, name):
+        seat = self.open_seats()[0]
+        player = self.game.players[seat]
+        player.name = name
+        player.ai = RemoteSeat(connection)
+        connection.send_message(type='seated', table=self.id, seat=seat,
+                        players=[p.name for p in self.game.players])
+        if not self.open_seats():
+            self.server.schedule(self)
+        return seat
+
+    def leave(self, connection):
+        """
+        Hand the seat of a client that went away to the standard AI
+        """
+        for seat, player in enumerate(self.game.players):
+            if isinstance(player.ai, RemoteSeat) and \
+                    player.ai.connection is connection:
+                player.ai = AI()
+                if self.waiting == seat:
+                    self.waiting = None
+                    self.server.schedule(self)
+        if not any(isinstance(p.ai, RemoteSeat) for p in self.game.players) \
+                and self.deals is None:
+            self.close()
+
+    def close(self):
+        self.closed = True
+        self.server.tables.pop(self.id, None)
+
+    def broadcast(self, **message):
+        for player in self.game.players:
+            if isinstance(player.ai, RemoteSeat):
+                player.ai.connection.send_message(**message)
+
+    def run(self, budget=BUDGET):
+        """
+        Advance until a decision has to be waited for or budget decisions
+        have been made, returns whether the table can go on right away
+        """
+        game = self.game
+        for i in xrange(budget):
+            if self.closed or self.waiting is not None:
+                return False
+            if self.turns is None:
+                if self.deals is not None and self.played >= self.deals:
+                    self.close()
+                    return False
+                self.turns = game.turns()
+                dealt = True
+            else:
+                dealt = False
+            try:
+                player, kind = next(self.turns)
+            except StopIteration:
+                self.turns = None
+                self.played += 1
+                game.collect()
+                continue
+            if dealt:
+                for seated in game.players:
+                    if isinstance(seated.ai, RemoteSeat):
+                        seated.ai.connection.send_message(
+                            type='deal', dealer=game.dealer,
+                            trump=game.trump.name,
+                            hand=[c.name for c in seated.hand])
+            if not self.ask(player, kind):
+                return False
+        return True
+
+    def ask(self, player, kind):
+        """
+        Get the decision of player ready, returns whether it is
+        """
+        game = self.game
+        seat = game.players.index(player)
+        if isinstance(player.ai, RemoteSeat):
+            if kind == 'bid':
+                player.ai.connection.send_message(
+                    type='bid?', options=game.get_possible_bids())
+            else:
+                player.ai.connection.send_message(
+                    type='play?',
+                    valid=[c.name for c in player.valid_cards(game)],
+                    trick=[c.name for c, p in game.trick.played_cards])
+            self.waiting = seat
+            self.kind = kind
+            return False
+        if isinstance(player.ai, OffloadedAI):
+            self.waiting = seat
+            self.kind = kind
+            self.server.offload(self, seat, kind)
+            return False
+        return True
+
+    def decide(self, seat, decision):
+        """
+        Resume with the decision of the seat the table was waiting for
+        """
+        self.waiting = None
+        self.game.players[seat].ai.decision = decision
+        self.server.schedule(self)
+
+    def answer(self, connection, message):
+        """
+        Check a decision from a client and resume with it
+        """
+        game = self.game
+        seat = self.waiting
+        if seat is None or message.get('type') != self.kind or \
+                getattr(game.players[seat].ai, 'connection', None) \
+                is not connection:
+            return connection.error('not your turn')
+        if self.kind == 'bid':
+            bid = message.get('bid')
+            if bid not in game.get_possible_bids():
+                return connection.error('invalid bid')
+            return self.decide(seat, bid)
+        name = message.get('card')
+        if not isinstance(name, basestring):
+            return connection.error('invalid card')
+        chosen = [card for card in game.players[seat].valid_cards(game)
+                  if card.name.lower() == name.lower()]
+        if not chosen:
+            return connection.error('invalid card')
+        self.decide(seat, chosen[0])
+
+
+class Connection(asynchat.async_chat):
+    """
+    A client speaking one JSON message per line
+    """
+
+    def __init__(self, sock, server):
+        asynchat.async_chat.__init__(self, sock, map=server.map)
+        self.set_terminator('\n')
+        self.server = server
+        self.buffer = []
+        self.table = None
+        self.watching = None    # spectators.Subscription of a spectator
+
+    def collect_incoming_data(self, data):
+        self.buffer.append(data)
+
+    def found_terminator(self):
+        line = ''.join(self.buffer)
+        self.buffer = []
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return self.error('invalid message')
+        if not isinstance(message, dict):
+            return self.error('invalid message')
+        self.server.receive(self, message)
+
+    def send_message(self, **message):
+        self.push(json.dumps(message) + '\n')
+
+    def error(self, message):
+        self.send_message(type='error', message=message)
+
+    def feed(self):
+        """
+        Send a spectator what it has waiting, as far as its socket keeps up
+        """
+        room = SEND_BACKLOG - len(self.producer_fifo)
+        if room > 0:
+            for line in self.watching.read(room):
+                self.push(line)
+
+    def handle_close(self):
+        self.close()
+        if self.table is not None:
+            self.table.leave(self)
+            self.table = None
+        if self.watching is not None:
+            self.watching.close()
+            self.watching = None
+            self.server.spectators.discard(self)
+
+
+class Server(asyncore.dispatcher):
+    """
+    Hosts any number of tables in one process
+
+    Tables take turns on the event loop, a table only holds on to it while
+    its AIs decide inline. AIs with an expensive attribute set decide on a
+    pool of threads instead. Deals at all tables go to ledger (a
+    ledger.Ledger) when one is given, under the id of their table.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, threads=4, ledger=None):
+        self.map = {}
+        asyncore.dispatcher.__init__(self, map=self.map)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(128)
+        self.address = self.socket.getsockname()
+        self.tables = {}
+        self.ids = itertools.count(1)
+        self.ready = collections.deque()
+        self.decided = Queue.Queue()
+        self.pool = ThreadPool(threads)
+        self.offloaded = 0
+        self.ledger = ledger
+        self.spectators = set()     # Connections watching a table
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            Connection(pair[0], self)
+
+    def add_table(self, ais=(None, None, None, None), deals=None):
+        table = Table(self, next(self.ids), ais, deals)
+        self.tables[table.id] = table
+        if not table.open_seats():
+            self.schedule(table)
+        return table
+
+    def schedule(self, table):
+        self.ready.append(table)
+
+    def offload(self, table, seat, kind):
+        player = table.game.players[seat]
+        self.offloaded += 1
+        self.pool.apply_async(
+            player.ai.decide, (player, table.game, kind),
+            callback=lambda decision: self.decided.put(
+                (table, seat, decision)))
+
+    def receive(self, connection, message):
+        if connection.watching is not None:
+            connection.error('spectators can only watch')
+        elif message.get('type') == 'watch':
+            if connection.table is not None:
+                return connection.error('already seated')
+            table = self.tables.get(message.get('table'))
+            if table is None:
+                return connection.error('no such table')
+            connection.watching = table.spectators.subscribe()
+            self.spectators.add(connection)
+        elif message.get('type') == 'join':
+            if connection.table is not None:
+                return connection.error('already seated')
+            table = self.tables.get(message.get('table'))
+            if table is None or not table.open_seats():
+                table = self.open_table()
+            connection.table = table
+            table.sit(connection, message.get('name') or 'Guest')
+        elif connection.table is None:
+            connection.error('join a table first')
+        else:
+            connection.table.answer(connection, message)
+
+    def open_table(self):
+        """
+        A table with an open seat, a new one with three AIs if there is none
+        """
+        for table in self.tables.itervalues():
+            if table.open_seats() and table.turns is None:
+                return table
+        return self.add_table((None, AI(), AI(), AI()))
+
+    def run_ready(self):
+        """
+        Give every table that is ready one turn
+        """
+        while not self.decided.empty():
+            self.offloaded -= 1
+            table, seat, decision = self.decided.get()
+            table.decide(seat, decision)
+        for i in xrange(len(self.ready)):
+            table = self.ready.popleft()
+            if table.run():
+                self.ready.append(table)
+        for connection in list(self.spectators):   # feed() may close it
+            connection.feed()
+
+    def poll(self, timeout=0.01):
+        """
+        One round of the event loop, only waits for the network when no
+        table is ready to go on
+        """
+        asyncore.loop(0 if self.ready else timeout, use_poll=True,
+                      map=self.map, count=1)
+        self.run_ready()
+
+    def serve_forever(self):
+        try:
+            while True:
+                self.poll()
+        finally:
+            self.pool.terminate()
+            self.close()
+
+    def busy(self):
+        return bool(self.ready or self.offloaded)
+
+
+class Client(object):
+    """
+    Blocking client for a server, decide gets every bid? and play? message
+    and returns the bid or card to answer with
+    """
+
+    def __init__(self, address, name, decide, table=None):
+        self.socket = socket.create_connection(address)
+        self.file = self.socket.makefile('r')
+        self.decide = decide
+        self.send(type='join', name=name, table=table)
+
+    def send(self, **message):
+        self.socket.sendall(json.dumps(message) + '\n')
+
+    def messages(self):
+        for line in self.file:
+            yield json.loads(line)
+
+    def run(self, deals=None):
+        """
+        Play until the server hangs up or deals deals have been played,
+        yields every message
+        """
+        played = 0
+        for message in self.messages():
+            yield message
+            if message['type'] == 'bid?':
+                self.send(type='bid', bid=self.decide(message))
+            elif message['type'] == 'play?':
+                self.send(type='play', card=self.decide(message))
+            elif message['type'] == 'result':
+                played += 1
+                if deals is not None and played >= deals:
+                    break
+        self.close()
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+def watch(address, table):
+    """
+    Messages of a table as a spectator gets them, a snapshot first, until
+    the server hangs up
+    """
+    sock = socket.create_connection(address)
+    lines = sock.makefile('r')
+    try:
+        sock.sendall(json.dumps({'type': 'watch', 'table': table}) + '\n')
+        for line in lines:
+            yield json.loads(line)
+    finally:
+        lines.close()
+        sock.close()
+
+
+def ask_terminal(message):
+    """
+    Let someone at the terminal decide, like Human does
+    """
+    if message['type'] == 'bid?':
+        print(message['options'])
+        choices = message['options']
+    else:
+        print('Trick: %s' % ', '.join(message['trick']))
+        print('Valid: %s' % ', '.join(message['valid']))
+        choices = message['valid']
+    answer = raw_input('? ')
+    while message['type'] == 'bid?' and answer not in choices:
+        answer = raw_input('Please choose from %s ' % ', '.join(choices))
+    return answer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Host or join whist tables')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7070)
+    parser.add_argument('--connect', action='store_true',
+                        help='play at a table of a running server')
+    parser.add_argument('--name', default='Guest')
+    parser.add_argument('--watch', type=int, metavar='TABLE',
+                        help='watch a table of a running server')
+    parser.add_argument('--ledger', metavar='PATH',
+                        help='keep the deals in a SQLite database')
+    args = parser.parse_args(argv)
+
+    if not args.connect and args.watch is None:
+        ledger = Ledger(args.ledger) if args.ledger else None
+        server = Server(args.host, args.port, ledger=ledger)
+        print('Serving on %s:%d' % server.address)
+        try:
+            server.serve_forever()
+        finally:
+            if ledger is not None:
+                ledger.close()
+        return
+
+    if args.watch is not None:
+        messages = watch((args.host, args.port), args.watch)
+    else:
+        messages = Client((args.host, args.port), args.name,
+                          ask_terminal).run()
+    for message in messages:
+        if message['type'] not in ('bid?', 'play?'):
+            print(' '.join('%s=%s' % item for item in sorted(message.items())
+                           if item[0] != 'type') or message['type'])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
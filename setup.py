@@ -3,12 +3,16 @@ This is a setup.py script generated by py2applet
 
 Usage:
     python setup.py py2app
+    python setup.py build_ext --inplace
 """
 
-from setuptools import setup
+import sys
+
+from setuptools import setup, Extension
 
 APP = ['whistui.py']
-DATA_FILES = ['cards', 'Info.plist', 'icon.icns']
+DATA_FILES = ['cards', 'bidding.json', 'endgames.tb', 'Info.plist',
+              'icon.icns']
 OPTIONS = {'argv_emulation': False,
            'plist': 'Info.plist'}
 
@@ -16,5 +20,6 @@ setup(
     app=APP,
     data_files=DATA_FILES,
     options={'py2app': OPTIONS},
-    setup_requires=['py2app'],
+    setup_requires=['py2app'] if 'py2app' in sys.argv else [],
+    ext_modules=[Extension('_solver', ['_solver.c'])],
 )
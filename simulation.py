@@ -0,0 +1,119 @@
+import multiprocessing
+from collections import namedtuple
+
+from whist import Deck, Game
+from rng import CounterRandom, new_seed
+
+
+DealResult = namedtuple('DealResult', ('dealer', 'trump', 'hands', 'bids',
+                                       'offensive', 'winning_side',
+                                       'tricks'))
+
+
+def deal_rng(seed, index):
+    """
+    Independent random stream for deal number index of a seeded run
+    """
+    return CounterRandom(seed, index)
+
+
+def reset(game, dealer):
+    """
+    Empty the hands and tricks of a game and give the deal to dealer
+    """
+    game.dealer = dealer
+    game.playing = (dealer + 1) % 4
+    for player in game.players:
+        player.hand = []
+        player.tricks = []
+
+
+def play_deal(game, seed, index, writer=None):
+    """
+    Play deal number index on a silent game and return its DealResult
+
+    Every deal starts from a fresh deck with its own random stream and the
+    dealer rotating with index, so its outcome only depends on seed and index.
+    The deal is also appended to writer, a records.RecordWriter, if given.
+    """
+    game.deck = Deck(deal_rng(seed, index))
+    reset(game, index % 4)
+    game.start()
+    return finish_deal(game, writer)
+
+
+def finish_deal(game, writer=None):
+    """
+    Play out a game that has been dealt and bid, and return its DealResult
+    """
+    hands = tuple(player.hand.mask for player in game.players)
+    while len(game.players[game.playing].hand) > 0:
+        game.round()
+    winning_side = game.post_game(verbose=False)
+
+    players = game.players
+    bids = [None] * 4
+    for i, bid in enumerate(game.bids):
+        bids[(game.dealer + 1 + i) % 4] = bid
+    result = DealResult(
+        dealer=game.dealer,
+        trump=game.trump,
+        hands=hands,
+        bids=tuple(bids),
+        offensive=tuple(players.index(p) for p in game.mode.offensive),
+        winning_side=winning_side,
+        tricks=tuple(p.trick_count() for p in players))
+    if writer is not None:
+        writer.write(game)
+
+    game.collect()
+    return result
+
+
+def iter_deals(n_deals, players, seed=None, start=0, writer=None,
+               observers=()):
+    """
+    Play deals start .. start + n_deals - 1 without any output, yields the
+    DealResult of every deal as soon as it is played
+    """
+    seed = new_seed() if seed is None else seed
+    game = Game(players, verbose=False, observers=observers)
+    for i in xrange(start, start + n_deals):
+        yield play_deal(game, seed, i, writer)
+
+
+def simulate(n_deals, players, seed=None, start=0, writer=None,
+             observers=()):
+    """
+    Like iter_deals, but returns a list of DealResult in deal order
+
+    Hands (card masks as dealt), bids and tricks are indexed by seat.
+    """
+    return list(iter_deals(n_deals, players, seed, start, writer, observers))
+
+
+def _simulate_chunk(args):
+    players, seed, start, count = args
+    return simulate(count, players, seed, start)
+
+
+def parallel_simulate(n_deals, players, seed=None, processes=None,
+                      chunksize=500):
+    """
+    Like simulate, but spreads the deals over a pool of worker processes
+
+    The results are identical to simulate(n_deals, players, seed) whatever
+    the number of processes or the chunk size.
+    """
+    seed = new_seed() if seed is None else seed
+    chunks = [(players, seed, start, min(chunksize, n_deals - start))
+              for start in xrange(0, n_deals, chunksize)]
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = []
+        for chunk in pool.imap(_simulate_chunk, chunks):
+            results += chunk
+        return results
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,534 @@
+from whist import SUIT_MASKS, mask_of, popcount
+from canonical import canonical_hands
+
+try:
+    import _solver
+except ImportError:
+    _solver = None
+
+
+class Solver(object):
+    """
+    Double-dummy solver for the trick-taking phase
+
+    Works on fully known positions: four hands as card masks indexed by seat,
+    the trump suit and the seats of the offensive side. The search asks
+    "can the offensive side take at least n more tricks?" with alpha-beta
+    cutoffs.
+
+    Every answer comes with the cards whose rank mattered to it. The
+    transposition table is keyed on the suit lengths of every hand and the
+    seat to lead, and an entry only pins down who holds the cards down to
+    the lowest rank that mattered, so it also answers for all positions that
+    only differ in their small cards.
+
+    With a cache (a canonical.LRUCache), results are also stored per
+    position with the non-trump suits in canonical order, so they are reused
+    by other solvers and for positions that only differ by those suits.
+    With a tablebase (a tablebase.Tablebase), the search stops at the trick
+    start where the table takes over.
+
+    When the _solver extension is built, the search runs in it instead,
+    about 70 times faster. The tablebase is then left unused, looking
+    endgames up only pays off in the slower Python search.
+    """
+
+    def __init__(self, trump, offensive, cache=None, tablebase=None):
+        self.trump = trump
+        self.cache = cache
+        self.tablebase = tablebase
+        self.endgame_cards = tablebase.cards if tablebase else 0
+        self.offensive_seats = tuple(offensive)
+        self.endgames = {}
+        self.trump_mask = SUIT_MASKS[trump] if 0 <= trump < 4 else 0
+        self.offensive = [seat in offensive for seat in xrange(4)]
+        self.table = {}
+        self.suits = {}
+        self.nodes = 0
+        self.core = None
+        if _solver is not None:
+            self.core = _solver.Search(trump, self.offensive_seats)
+
+    def solve(self, hands, leader, trick=()):
+        """
+        Maximum number of remaining tricks the offensive side can take
+
+        hands are the cards left per seat, leader is the seat that leads
+        the current trick and trick lists the (card, seat) pairs already
+        played to it, those cards must no longer be in hands.
+        """
+        hands = [hand if isinstance(hand, (int, long)) else mask_of(hand)
+                 for hand in hands]
+        if self.cache is None:
+            return self.solve_masks(hands, leader, trick)
+        hands, trick, perm = canonical_hands(hands, self.trump, trick)
+        key = ('solve', self.trump, tuple(self.offensive), leader, hands,
+               tuple((card.index, seat) for card, seat in trick))
+        result = self.cache.get(key)
+        if result is None:
+            result = self.solve_masks(list(hands), leader, trick)
+            self.cache.put(key, result)
+        return result
+
+    def solve_masks(self, hands, leader, trick):
+        if self.core is not None:
+            tricks = self.core.solve(hands, leader,
+                                     [card.index for card, seat in trick])
+            self.nodes = self.core.nodes
+            return tricks
+        if not trick and popcount(hands[leader]) <= self.endgame_cards:
+            tricks = self.endgame(hands, leader)
+            if tricks is not None:
+                return tricks
+        trick = [card.index for card, seat in trick]
+        total = popcount(hands[leader]) + (1 if trick else 0)
+        low, high = 0, total
+        while low < high:
+            target = (low + high + 1) / 2
+            if trick:
+                result = self.play(hands, leader, trick, target)[0]
+            else:
+                result = self.search(hands, leader, target)[0]
+            if result:
+                low = target
+            else:
+                high = target - 1
+        return low
+
+    def search(self, hands, leader, target):
+        """
+        Can the offensive side take target more tricks from a trick start?
+
+        Returns the answer and the mask of the cards whose rank mattered.
+        """
+        if target <= 0:
+            return True, 0
+        remaining = popcount(hands[leader])
+        if target > remaining:
+            return False, 0
+
+        if remaining == 1:
+            trick = [hands[(leader + i) % 4].bit_length() - 1
+                     for i in xrange(4)]
+            position = self.winning(trick)
+            return (self.offensive[(leader + position) % 4],
+                    self.rank_mattered(trick, position))
+
+        quick, relevant = self.quick_tricks(hands, leader)
+        if self.offensive[leader]:
+            if quick >= target:
+                return True, relevant
+        elif target > remaining - quick:
+            return False, relevant
+        if self.trump_mask:
+            attacking, sure, relevant = self.top_trumps(hands)
+            if attacking:
+                if sure >= target:
+                    return True, relevant
+            elif target > remaining - sure:
+                return False, relevant
+
+        key, suits = self.describe(hands, leader)
+        entries = self.table.get(key)
+        if entries is None:
+            entries = self.table[key] = []
+        best_suit = -1
+        for entry in entries:
+            if self.matches(entry[0], suits):
+                if entry[1] >= target:
+                    return True, self.top_cards(entry[0], hands)
+                if entry[2] < target:
+                    return False, self.top_cards(entry[0], hands)
+                best_suit = entry[3]
+
+        if remaining <= self.endgame_cards:
+            tricks = self.endgame(hands, leader)
+            if tricks is not None:
+                return tricks >= target, self.pinned(hands)
+
+        attacking = self.offensive[leader]
+        hand = hands[leader]
+        trick = []
+        result = not attacking
+        relevant = 0
+        for card in self.leads(hands, leader, best_suit):
+            hands[leader] = hand ^ (1 << card)
+            trick.append(card)
+            found, cards = self.play(hands, leader, trick, target)
+            trick.pop()
+            hands[leader] = hand
+            if found == attacking:
+                result, relevant = found, cards
+                best_suit = card / 13
+                break
+            relevant |= cards
+
+        self.store(entries, suits, hands, relevant, result, target,
+                   remaining, best_suit)
+        return result, relevant
+
+    def play(self, hands, leader, trick, target):
+        """
+        Can the offensive side take target more tricks, given the cards
+        already played to the current trick?
+        """
+        self.nodes += 1
+        if len(trick) == 4:
+            position = self.winning(trick)
+            winner = (leader + position) % 4
+            won = 1 if self.offensive[winner] else 0
+            result, relevant = self.search(hands, winner, target - won)
+            return result, relevant | self.rank_mattered(trick, position)
+
+        seat = (leader + len(trick)) % 4
+        hand = hands[seat]
+        attacking = self.offensive[seat]
+        relevant = 0
+        for card in self.moves(hands, seat, trick):
+            hands[seat] = hand ^ (1 << card)
+            trick.append(card)
+            result, cards = self.play(hands, leader, trick, target)
+            trick.pop()
+            hands[seat] = hand
+            if result == attacking:
+                return result, cards
+            relevant |= cards
+        return not attacking, relevant
+
+    def winning(self, trick):
+        """
+        Position in trick of the card that wins it
+        """
+        best = 0
+        for i in xrange(1, len(trick)):
+            card, top = trick[i], trick[best]
+            if card / 13 == top / 13:
+                if card > top:
+                    best = i
+            elif card / 13 == self.trump:
+                best = i
+        return best
+
+    def rank_mattered(self, trick, position):
+        """
+        Mask of the winning card if it beat another card of its own suit
+        """
+        suit = trick[position] / 13
+        for i, card in enumerate(trick):
+            if i != position and card / 13 == suit:
+                return 1 << trick[position]
+        return 0
+
+    def quick_tricks(self, hands, leader):
+        """
+        Tricks the leader is sure to take by cashing top cards, and the
+        cards used for them
+        """
+        hand = hands[leader]
+        side = self.offensive[leader]
+        opponents = [hands[seat] for seat in xrange(4)
+                     if self.offensive[seat] != side]
+        remaining = hands[0] | hands[1] | hands[2] | hands[3]
+
+        # Top trumps first, every round also draws a trump from each
+        # opponent that still has one
+        tricks = 0
+        relevant = 0
+        trump_mask = self.trump_mask
+        if trump_mask:
+            trumps = remaining & trump_mask
+            while trumps:
+                top = 1 << (trumps.bit_length() - 1)
+                if not hand & top:
+                    break
+                trumps ^= top
+                relevant |= top
+                tricks += 1
+            opponents = [opponent for opponent in opponents
+                         if popcount(opponent & trump_mask) > tricks]
+        else:
+            opponents = []
+
+        # Then top cards in the other suits, as long as no opponent with
+        # trumps left can ruff them
+        for suit_mask in SUIT_MASKS:
+            if suit_mask == trump_mask:
+                continue
+            limit = 13
+            for opponent in opponents:
+                limit = min(limit, popcount(opponent & suit_mask))
+            cards = remaining & suit_mask
+            while cards and limit:
+                top = 1 << (cards.bit_length() - 1)
+                if not hand & top:
+                    break
+                cards ^= top
+                relevant |= top
+                tricks += 1
+                limit -= 1
+
+        return tricks, relevant
+
+    def top_trumps(self, hands):
+        """
+        Tricks a side is sure to take with the highest trumps
+
+        The highest remaining trump wins whatever trick it is played to, so
+        every card of a player in the run of top trumps held by one side is
+        a sure trick for that side. Returns whether that side is the
+        offensive one, the number of tricks and the cards that decide it.
+        """
+        trumps = [hand & self.trump_mask for hand in hands]
+        remaining = trumps[0] | trumps[1] | trumps[2] | trumps[3]
+        if not remaining:
+            return False, 0, 0
+        top = 1 << (remaining.bit_length() - 1)
+        side = self.offensive[self.holder(trumps, top)]
+        run = remaining
+        for seat in xrange(4):
+            if self.offensive[seat] != side and trumps[seat]:
+                run &= ~((1 << trumps[seat].bit_length()) - 1)
+        sure = max(popcount(trumps[seat] & run) for seat in xrange(4)
+                   if self.offensive[seat] == side)
+        below = remaining & ~run
+        if below:
+            run |= 1 << (below.bit_length() - 1)
+        return side, sure, run
+
+    def describe(self, hands, leader):
+        """
+        Transposition key of a trick start and the per suit descriptions
+        the table entries are matched against
+
+        A suit is described by its length in every hand, the total length
+        and the seats holding its cards from high to low, two bits per card.
+        """
+        key = [leader]
+        suits = []
+        cache = self.suits
+        for suit_mask in SUIT_MASKS:
+            holding = (hands[0] & suit_mask, hands[1] & suit_mask,
+                       hands[2] & suit_mask, hands[3] & suit_mask)
+            suit = cache.get(holding)
+            if suit is None:
+                lengths = (popcount(holding[0]) | popcount(holding[1]) << 4 |
+                           popcount(holding[2]) << 8 |
+                           popcount(holding[3]) << 12)
+                cards = holding[0] | holding[1] | holding[2] | holding[3]
+                total = popcount(cards)
+                pattern = 0
+                while cards:
+                    top = 1 << (cards.bit_length() - 1)
+                    cards ^= top
+                    for seat in xrange(4):
+                        if holding[seat] & top:
+                            pattern = pattern << 2 | seat
+                suit = cache[holding] = (lengths, total, pattern)
+            key.append(suit[0])
+            suits.append(suit)
+        return tuple(key), suits
+
+    def matches(self, tops, suits):
+        """
+        Do the top cards pinned down by a table entry have the same holders?
+        """
+        for i in xrange(4):
+            count, pattern = tops[i]
+            if count and suits[i][2] >> 2 * (suits[i][1] - count) != pattern:
+                return False
+        return True
+
+    def top_cards(self, tops, hands):
+        """
+        Mask of the cards pinned down by a table entry
+        """
+        remaining = hands[0] | hands[1] | hands[2] | hands[3]
+        cards = 0
+        for i in xrange(4):
+            suit = remaining & SUIT_MASKS[i]
+            for j in xrange(tops[i][0]):
+                top = 1 << (suit.bit_length() - 1)
+                suit ^= top
+                cards |= top
+        return cards
+
+    def store(self, entries, suits, hands, relevant, result, target,
+              remaining, best_suit):
+        """
+        Record a search result for all positions that share the holders of
+        the cards down to the lowest relevant card of every suit
+        """
+        cards = hands[0] | hands[1] | hands[2] | hands[3]
+        tops = []
+        for i in xrange(4):
+            suit_relevant = relevant & SUIT_MASKS[i]
+            if suit_relevant:
+                lowest = suit_relevant & -suit_relevant
+                count = popcount(cards & SUIT_MASKS[i] & ~(lowest - 1))
+                tops.append((count,
+                             suits[i][2] >> 2 * (suits[i][1] - count)))
+            else:
+                tops.append((0, 0))
+        tops = tuple(tops)
+
+        for entry in entries:
+            if entry[0] == tops:
+                break
+        else:
+            entry = [tops, 0, remaining, best_suit]
+            entries.append(entry)
+        if result:
+            entry[1] = max(entry[1], target)
+        else:
+            entry[2] = min(entry[2], target - 1)
+        entry[3] = best_suit
+
+    def endgame(self, hands, leader):
+        """
+        Tablebase result of a trick start, looked up once per position
+        """
+        key = (hands[0], hands[1], hands[2], hands[3], leader)
+        try:
+            return self.endgames[key]
+        except KeyError:
+            tricks = self.endgames[key] = self.tablebase.lookup(
+                hands, self.trump, leader, self.offensive_seats)
+            return tricks
+
+    def pinned(self, hands):
+        """
+        Cards that pin down who holds every card, given the suit lengths
+
+        The run of lowest cards of a suit held by one seat follows from the
+        lengths, a tablebase answer can depend on all the other cards.
+        """
+        remaining = hands[0] | hands[1] | hands[2] | hands[3]
+        cards = 0
+        for suit_mask in SUIT_MASKS:
+            suit = remaining & suit_mask
+            if suit:
+                lowest = suit & -suit
+                others = suit & ~hands[self.holder(hands, lowest)]
+                if others:
+                    cards |= suit & ~((others & -others) - 1)
+        return cards
+
+    def holder(self, hands, card_mask):
+        for seat in xrange(4):
+            if hands[seat] & card_mask:
+                return seat
+
+    def leads(self, hands, leader, best_suit=-1):
+        """
+        Cards worth leading, in the order they should be tried
+
+        The suit that worked best in an earlier search of the position goes
+        first, then cashing top cards, then leading low towards a partner's
+        top card and finally the other leads.
+        """
+        hand = hands[leader]
+        remaining = hands[0] | hands[1] | hands[2] | hands[3]
+        side = self.offensive[leader]
+        first = []
+        cash = []
+        towards = []
+        rest = []
+        for suit_mask in SUIT_MASKS:
+            cards = self.groups(hand & suit_mask, remaining)
+            if not cards:
+                continue
+            if cards[0] / 13 == best_suit:
+                first += cards
+                continue
+            top = 1 << ((remaining & suit_mask).bit_length() - 1)
+            if hand & top:
+                cash.append(cards[0])
+                rest += cards[1:]
+            elif self.offensive[self.holder(hands, top)] == side:
+                towards.append(cards[-1])
+                rest += cards[:-1]
+            else:
+                rest += reversed(cards)
+        return first + cash + towards + rest
+
+    def groups(self, cards, remaining):
+        """
+        One card out of every run of touching cards, high to low
+
+        Cards are touching when none of the remaining cards of the other
+        players lies between them, so playing either has the same effect.
+        """
+        groups = []
+        previous = 0
+        while cards:
+            top = 1 << (cards.bit_length() - 1)
+            cards ^= top
+            if not previous or remaining & ~((top << 1) - 1) & (previous - 1):
+                groups.append(top.bit_length() - 1)
+            previous = top
+        return groups
+
+    def moves(self, hands, seat, trick):
+        """
+        Legal cards for seat when following to trick, one per group of
+        equivalent cards, in the order they should be tried
+        """
+        hand = hands[seat]
+        suit = trick[0] / 13
+        in_suit = hand & SUIT_MASKS[suit]
+        if in_suit:
+            hand = in_suit
+        remaining = hands[0] | hands[1] | hands[2] | hands[3]
+        for card in trick:
+            remaining |= 1 << card
+        candidates = []
+        for suit_mask in SUIT_MASKS:
+            if hand & suit_mask:
+                candidates += self.groups(hand & suit_mask, remaining)
+        if len(candidates) < 2:
+            return candidates
+
+        # Duck when our side already wins the trick, otherwise try the
+        # cheapest card that takes it first
+        position = self.winning(trick)
+        best = trick[position]
+        winners = []
+        losers = []
+        for card in reversed(candidates):
+            if card / 13 == best / 13:
+                (winners if card > best else losers).append(card)
+            elif card / 13 == self.trump:
+                winners.append(card)
+            else:
+                losers.append(card)
+        winning_seat = (seat - len(trick) + position) % 4
+        if self.offensive[winning_seat] == self.offensive[seat]:
+            return losers + winners
+        return winners + losers
+
+
+def solve(hands, trump, leader, offensive, trick=(), cache=None,
+          tablebase=None):
+    """
+    Maximum number of remaining tricks the offensive seats can take
+    """
+    return Solver(trump, offensive, cache, tablebase).solve(hands, leader,
+                                                           trick)
+
+
+def solve_game(game):
+    """
+    Maximum number of tricks the offensive side of game.mode can take in
+    the whole deal, counting the tricks it already won
+    """
+    players = game.players
+    offensive = [players.index(p) for p in game.mode.offensive]
+    trick = []
+    leader = game.playing
+    if game.trick and game.trick.played_cards:
+        trick = [(card, players.index(player))
+                 for card, player in game.trick.played_cards]
+        leader = trick[0][1]
+    won = sum(players[seat].trick_count() for seat in offensive)
+    return won + solve([p.hand for p in players], game.trump.suit, leader,
+                       offensive, trick)
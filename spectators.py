@@ -0,0 +1,151 @@
+import collections
+import json
+
+from instrumentation import Observer
+
+
+class Subscription(object):
+    """
+    Messages a spectator has still to receive, encoded and at most maxlen
+    of them
+
+    visible holds the seats whose hands the spectator may see. A spectator
+    that falls maxlen messages behind loses its backlog and starts over
+    from a snapshot, as it does when it joins.
+    """
+
+    def __init__(self, publisher, visible=(), maxlen=256):
+        self.publisher = publisher
+        self.visible = frozenset(visible)
+        self.maxlen = maxlen
+        self.queue = collections.deque()
+        self.resync = True
+        self.dropped = 0
+
+    def put(self, line):
+        if self.resync:
+            return              # The snapshot will cover it
+        if len(self.queue) >= self.maxlen:
+            self.dropped += len(self.queue)
+            self.queue.clear()
+            self.resync = True
+            return
+        self.queue.append(line)
+
+    def read(self, limit=None):
+        """
+        Waiting messages, oldest first, up to limit of them
+        """
+        lines = []
+        if self.resync:
+            self.resync = False
+            lines.append(self.publisher.snapshot(self.visible))
+        while self.queue and (limit is None or len(lines) < limit):
+            lines.append(self.queue.popleft())
+        return lines
+
+    def close(self):
+        self.publisher.unsubscribe(self)
+
+
+class Publisher(Observer):
+    """
+    Fans the events of a game out to any number of spectators
+
+    A spectator gets a snapshot of the game first and then one small
+    message per event, numbered by seq so gaps show. Every message is
+    encoded once for all spectators, only the hands in deal messages and
+    snapshots are encoded once per set of visible seats. Hands that aren't
+    visible are sent as their number of cards.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.subscriptions = []
+        self.seq = 0
+        self.bids = [None] * 4
+        self.dealt = False      # Whether the deal has been published
+        game.observers.append(self)
+
+    def subscribe(self, visible=(), maxlen=256):
+        subscription = Subscription(self, visible, maxlen)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+
+    def hands(self, visible):
+        return [[card.name for card in player.hand] if seat in visible
+                else len(player.hand)
+                for seat, player in enumerate(self.game.players)]
+
+    def publish(self, message, hands=False):
+        """
+        Number message and queue it for every spectator, with the hands
+        each of them may see when hands is set
+        """
+        self.seq += 1
+        message['seq'] = self.seq
+        lines = {}
+        for subscription in self.subscriptions:
+            view = subscription.visible if hands else None
+            line = lines.get(view)
+            if line is None:
+                if hands:
+                    message['hands'] = self.hands(view)
+                line = lines[view] = json.dumps(message) + '\n'
+            subscription.put(line)
+
+    def snapshot(self, visible=frozenset()):
+        """
+        Encoded state of the game as the seats in visible see it
+        """
+        game = self.game
+        players = game.players
+        trick = game.trick.played_cards if game.trick else []
+        return json.dumps({
+            'type': 'snapshot',
+            'seq': self.seq,
+            'players': [player.name for player in players],
+            'dealer': game.dealer,
+            'trump': game.trump.name if game.trump else None,
+            'bids': self.bids,
+            'hands': self.hands(visible),
+            'trick': [[players.index(player), card.name]
+                      for card, player in trick],
+            'tricks': [player.trick_count() for player in players],
+        }) + '\n'
+
+    def publish_deal(self):
+        if not self.dealt:
+            self.dealt = True
+            self.publish({'type': 'deal', 'dealer': self.game.dealer,
+                          'trump': self.game.trump.name}, hands=True)
+
+    def deal_start(self, game, t):
+        self.bids = [None] * 4
+        self.dealt = False
+
+    def bid(self, game, t, player, bid, elapsed):
+        self.publish_deal()
+        seat = game.players.index(player)
+        self.bids[seat] = bid
+        self.publish({'type': 'bid', 'seat': seat, 'bid': bid})
+
+    def card_played(self, game, t, player, card, elapsed):
+        self.publish_deal()
+        self.publish({'type': 'card', 'seat': game.players.index(player),
+                      'card': card.name})
+
+    def trick_won(self, game, t, player, trick, elapsed):
+        self.publish({'type': 'trick', 'seat': game.players.index(player)})
+
+    def post_game(self, game, t, winning_side, elapsed):
+        players = game.players
+        self.publish({
+            'type': 'result',
+            'winning_side': winning_side,
+            'offensive': [players.index(p) for p in game.mode.offensive],
+            'tricks': [p.trick_count() for p in players]})
@@ -0,0 +1,86 @@
+import glob
+import json
+import os
+import sys
+
+
+ATLAS = 'atlas.png'
+INDEX = 'atlas.json'
+WIDTH = 1024            # Width of the atlas, sprites are packed in rows
+
+
+def build_atlas(directory='cards'):
+    """
+    Pack every image of directory into one atlas image, and write the
+    (x, y, width, height) of every sprite by name next to it
+    """
+    from PIL import Image
+
+    paths = [path for path in sorted(glob.glob(os.path.join(directory, '*')))
+             if path.endswith(('.gif', '.png')) and
+             os.path.basename(path) != ATLAS]
+    images = [(os.path.splitext(os.path.basename(path))[0],
+               Image.open(path).convert('RGB')) for path in paths]
+    images.sort(key=lambda (name, image): (-image.size[1], name))
+
+    index = {}
+    x = y = row_height = 0
+    for name, image in images:
+        width, height = image.size
+        if x + width > WIDTH:
+            x, y = 0, y + row_height
+            row_height = 0
+        index[name] = (x, y, width, height)
+        x += width
+        row_height = max(row_height, height)
+
+    atlas = Image.new('RGB', (WIDTH, y + row_height))
+    for name, image in images:
+        atlas.paste(image, index[name][:2])
+    atlas.save(os.path.join(directory, ATLAS), optimize=True)
+    with open(os.path.join(directory, INDEX), 'w') as f:
+        json.dump(index, f, sort_keys=True)
+
+
+class Sprites(object):
+    """
+    PhotoImages cut out of the atlas when first asked for
+
+    Tk 8.6 reads the PNG atlas itself, older Tk needs PIL to load it.
+    """
+
+    def __init__(self, master, directory='cards'):
+        self.master = master
+        with open(os.path.join(directory, INDEX)) as f:
+            self.index = dict((name, tuple(box))
+                              for name, box in json.load(f).iteritems())
+        self.atlas = self.load(os.path.join(directory, ATLAS))
+        self.cache = {}
+
+    def load(self, path):
+        import Tkinter as Tk
+
+        try:
+            return Tk.PhotoImage(master=self.master, file=path)
+        except Tk.TclError:
+            from PIL import Image, ImageTk
+            return ImageTk.PhotoImage(Image.open(path), master=self.master)
+
+    def size(self, name):
+        return self.index[name][2:]
+
+    def __getitem__(self, name):
+        if name not in self.cache:
+            import Tkinter as Tk
+
+            x, y, width, height = self.index[name]
+            image = Tk.PhotoImage(master=self.master, width=width,
+                                  height=height)
+            image.tk.call(image, 'copy', self.atlas, '-from', x, y,
+                          x + width, y + height)
+            self.cache[name] = image
+        return self.cache[name]
+
+
+if __name__ == '__main__':
+    build_atlas(sys.argv[1] if len(sys.argv) > 1 else 'cards')
@@ -0,0 +1,109 @@
+from whist import CARDS, SUIT_MASKS, cards_of, popcount
+
+
+class GameState(object):
+    """
+    Immutable snapshot of a deal being played
+
+    hands are the card masks per seat, trick the indexes of the cards
+    played to the current trick, starting with the one leader led, and
+    tricks the number of tricks taken per seat. apply returns a new state
+    and leaves this one alone, so a search undoes a move by going back to
+    the state it came from. Equal states hash equal, the hash is computed
+    once.
+    """
+    __slots__ = ('hands', 'trick', 'leader', 'trump', 'tricks', 'hash')
+
+    def __init__(self, hands, trump, leader, trick=(), tricks=(0, 0, 0, 0)):
+        self.hands = tuple(hands)
+        self.trump = trump
+        self.leader = leader
+        self.trick = tuple(trick)
+        self.tricks = tuple(tricks)
+        self.hash = hash((self.hands, self.trump, self.leader, self.trick,
+                          self.tricks))
+
+    @classmethod
+    def from_game(cls, game):
+        players = game.players
+        trick = game.trick.played_cards if game.trick else []
+        leader = players.index(trick[0][1]) if trick else game.playing
+        return cls([player.hand.mask for player in players], game.trump.suit,
+                   leader, [card.index for card, player in trick],
+                   [player.trick_count() for player in players])
+
+    @property
+    def turn(self):
+        """
+        Seat to play next
+        """
+        return (self.leader + len(self.trick)) % 4
+
+    def is_over(self):
+        return not self.hands[self.turn]
+
+    def legal_mask(self):
+        """
+        Mask of the cards the seat to play may play, as Game.valid_cards
+        """
+        hand = self.hands[self.turn]
+        if self.trick:
+            in_suit = hand & SUIT_MASKS[self.trick[0] / 13]
+            if in_suit:
+                return in_suit
+        return hand
+
+    def legal_moves(self):
+        return cards_of(self.legal_mask())
+
+    def winner(self, trick=None):
+        """
+        Seat that wins trick (the current trick by default), as Trick.winning
+        """
+        trick = self.trick if trick is None else trick
+        best = 0
+        for i in xrange(1, len(trick)):
+            card, winning = trick[i], trick[best]
+            if card / 13 == winning / 13:
+                if card > winning:
+                    best = i
+            elif card / 13 == self.trump:
+                best = i
+        return (self.leader + best) % 4
+
+    def apply(self, card):
+        """
+        State after the seat to play plays card, the trick is resolved when
+        it is the fourth
+        """
+        seat = self.turn
+        hands = list(self.hands)
+        hands[seat] &= ~card.mask
+        trick = self.trick + (card.index,)
+        if len(trick) < 4:
+            return GameState(hands, self.trump, self.leader, trick,
+                             self.tricks)
+        winner = self.winner(trick)
+        tricks = list(self.tricks)
+        tricks[winner] += 1
+        return GameState(hands, self.trump, winner, (), tricks)
+
+    def cards_left(self):
+        return popcount(self.hands[self.leader])
+
+    def __eq__(self, other):
+        return isinstance(other, GameState) and self.hash == other.hash and \
+            self.hands == other.hands and self.trick == other.trick and \
+            self.leader == other.leader and self.trump == other.trump and \
+            self.tricks == other.tricks
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return self.hash
+
+    def __repr__(self):
+        return '<GameState: %s to play, trick %s, tricks %s>' % (
+            self.turn, ', '.join(str(CARDS[i]) for i in self.trick),
+            self.tricks)
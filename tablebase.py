@@ -0,0 +1,254 @@
+import mmap
+import struct
+import sys
+import warnings
+from array import array
+
+from whist import SUIT_MASKS, data_path, popcount
+
+
+TABLE_PATH = data_path('endgames.tb')
+MAGIC = 'WEND'
+VERSION = 1
+HEADER = struct.Struct('<4sBB')     # Magic, version, cards per hand
+ENTRY = struct.Struct('<H')
+MAX_CARDS = 3                       # Tricks have to fit in two bits
+# Offensive sides that hold the leader, as seat masks relative to the
+# leader; an entry has the tricks of that side for each in two bits
+SIDES = (1, 3, 5, 9, 7, 11, 13)
+SIDE_SHIFT = dict((side, 2 * i) for i, side in enumerate(SIDES))
+
+_multinomials = {}
+_compositions = {}
+_table = None
+
+
+def multinomial(counts):
+    """
+    Orders of a sequence holding every seat counts[seat] times
+    """
+    counts = tuple(counts)
+    result = _multinomials.get(counts)
+    if result is None:
+        result = 1
+        total = 0
+        for count in counts:
+            for i in xrange(count):
+                total += 1
+                result = result * total / (i + 1)
+        _multinomials[counts] = result
+    return result
+
+
+def compositions(cards):
+    """
+    Suit lengths of the endgames with cards cards per hand, trump first and
+    the other suits from long to short, mapped to their order in the table
+    """
+    result = _compositions.get(cards)
+    if result is None:
+        total = 4 * cards
+        lengths = [(trumps, a, b, total - trumps - a - b)
+                   for trumps in xrange(total + 1)
+                   for a in xrange(total - trumps + 1)
+                   for b in xrange(min(a, total - trumps - a) + 1)
+                   if b >= total - trumps - a - b]
+        result = _compositions[cards] = dict(
+            (composition, i) for i, composition in enumerate(lengths))
+    return result
+
+
+def section_size(cards):
+    """
+    Entries for the endgames with cards cards per hand
+    """
+    return len(compositions(cards)) * multinomial((cards,) * 4)
+
+
+def rank_seats(seats, cards):
+    """
+    Position of a sequence of seats, every one of them cards times, in the
+    lexicographic order of all such sequences
+    """
+    counts = [cards] * 4
+    rank = 0
+    for seat in seats:
+        for lower in xrange(seat):
+            if counts[lower]:
+                counts[lower] -= 1
+                rank += multinomial(counts)
+                counts[lower] += 1
+        counts[seat] -= 1
+    return rank
+
+
+def seat_orders(counts):
+    """
+    All sequences holding every seat counts[seat] times, in lexicographic
+    order
+    """
+    if not any(counts):
+        yield ()
+        return
+    for seat in xrange(4):
+        if counts[seat]:
+            counts[seat] -= 1
+            for rest in seat_orders(counts):
+                yield (seat,) + rest
+            counts[seat] += 1
+
+
+def describe(hands, trump, leader):
+    """
+    Holders of every suit from high to low, as seats relative to the
+    leader, with the trump suit first and the other suits in canonical order
+
+    Only the order of the cards left in a suit matters, and the non-trump
+    suits can be swapped freely, so every endgame that only differs in
+    those ways gets the same description.
+    """
+    seats = [hands[(leader + i) % 4] for i in xrange(4)]
+    remaining = seats[0] | seats[1] | seats[2] | seats[3]
+    suits = []
+    for suit_mask in SUIT_MASKS:
+        cards = remaining & suit_mask
+        holders = []
+        while cards:
+            top = 1 << (cards.bit_length() - 1)
+            cards ^= top
+            holders.append(0 if seats[0] & top else 1 if seats[1] & top
+                           else 2 if seats[2] & top else 3)
+        suits.append(tuple(holders))
+    trumps = suits.pop(trump)
+    suits.sort(key=lambda holders: (len(holders), holders), reverse=True)
+    return [trumps] + suits
+
+
+def is_canonical(suits):
+    for a, b in zip(suits[1:], suits[2:]):
+        if len(a) == len(b) and a < b:
+            return False
+    return True
+
+
+def entry_index(suits, cards):
+    composition = tuple(len(holders) for holders in suits)
+    return compositions(cards)[composition] * multinomial((cards,) * 4) + \
+        rank_seats(sum(suits, ()), cards)
+
+
+class Tablebase(object):
+    """
+    Double-dummy results of every endgame with up to cards cards per hand,
+    mapped from a file written by build
+
+    An entry is stored for each endgame in canonical form (see describe)
+    and holds the tricks the leader's side takes for every way of
+    splitting the seats into an offensive and a defensive side.
+    """
+
+    def __init__(self, path=TABLE_PATH):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.cards = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('%s is not a version %d endgame table' %
+                             (path, VERSION))
+        self.offsets = [None, HEADER.size]
+        for cards in xrange(1, self.cards + 1):
+            self.offsets.append(self.offsets[-1] +
+                                ENTRY.size * section_size(cards))
+
+    def lookup(self, hands, trump, leader, offensive):
+        """
+        Tricks the offensive seats take from a trick start where every hand
+        (a card mask) has the same number of cards, None when the table
+        does not cover it
+        """
+        cards = popcount(hands[leader])
+        if cards > self.cards or not 0 <= trump < 4:
+            return None
+        side = 0
+        for seat in offensive:
+            side |= 1 << (seat - leader) % 4
+        if not side or side == 15:
+            return cards if side else 0
+        suits = describe(hands, trump, leader)
+        entry = ENTRY.unpack_from(self.map, self.offsets[cards] +
+                                  ENTRY.size * entry_index(suits, cards))[0]
+        if side & 1:
+            return entry >> SIDE_SHIFT[side] & 3
+        return cards - (entry >> SIDE_SHIFT[side ^ 15] & 3)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def load(path=TABLE_PATH):
+    """
+    The shared table, mapped on first use, None with a warning when there
+    is no usable table
+    """
+    global _table
+    if _table is None:
+        try:
+            _table = Tablebase(path)
+        except (IOError, ValueError) as e:
+            warnings.warn('no endgame table, build it with tablebase.py: %s'
+                          % e, RuntimeWarning)
+            _table = False
+    return _table or None
+
+
+def solve_entry(solvers, suits):
+    """
+    Entry of an endgame in canonical form, with trump suit 0 and the leader
+    in seat 0
+    """
+    hands = [0] * 4
+    for suit, holders in enumerate(suits):
+        for i, seat in enumerate(holders):
+            hands[seat] |= 1 << (13 * suit + 12 - i)
+    entry = 0
+    for side, solver in zip(SIDES, solvers):
+        entry |= solver.solve(hands, 0) << SIDE_SHIFT[side]
+    return entry
+
+
+def build(max_cards=2, path=TABLE_PATH):
+    """
+    Solve every endgame of up to max_cards cards per hand and write the
+    table
+
+    Only canonical endgames are solved, the entries of the others stay 0.
+    Sizes grow fast: 2 cards take about 200 kB, 3 cards about 75 MB and
+    many hours.
+    """
+    from solver import Solver
+
+    if not 1 <= max_cards <= MAX_CARDS:
+        raise ValueError('tables go up to %d cards per hand' % MAX_CARDS)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, max_cards))
+        for cards in xrange(1, max_cards + 1):
+            solvers = [Solver(0, [seat for seat in xrange(4)
+                                  if side >> seat & 1])
+                       for side in SIDES]
+            for composition in sorted(compositions(cards),
+                                      key=compositions(cards).get):
+                entries = array('H', [0]) * multinomial((cards,) * 4)
+                bounds = [sum(composition[:i]) for i in xrange(5)]
+                for rank, seats in enumerate(seat_orders([cards] * 4)):
+                    suits = [seats[bounds[i]:bounds[i + 1]]
+                             for i in xrange(4)]
+                    if is_canonical(suits):
+                        entries[rank] = solve_entry(solvers, suits)
+                if sys.byteorder != 'little':
+                    entries.byteswap()
+                entries.tofile(f)
+
+
+if __name__ == '__main__':
+    build(int(sys.argv[1]) if len(sys.argv) > 1 else 2)
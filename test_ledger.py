@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ledger import Ledger, connect, player_record
+from simulation import simulate
+from whist import AI, Player
+
+
+def players():
+    return [Player('Player %d' % (i + 1), AI()) for i in xrange(4)]
+
+
+class LedgerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'ledger.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_tables(self):
+        with Ledger(self.path, session='s') as ledger:
+            simulate(3, players(), seed=1, observers=[ledger.table(1)])
+            simulate(2, players(), seed=2, observers=[ledger.table(2)])
+            self.assertEqual(len(ledger.standings()), 8)
+        with Ledger(self.path, session='s') as ledger:
+            simulate(1, players(), seed=3, observers=[ledger.table(2)])
+        connection = connect(self.path)
+        self.assertEqual(
+            connection.execute('SELECT table_id, number FROM deals '
+                               'ORDER BY table_id, number').fetchall(),
+            [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (2, 3)])
+        self.assertEqual(player_record(connection, 'Player 2', 1)[0], 3)
+        self.assertEqual(player_record(connection, 'Player 2')[0], 6)
+        connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
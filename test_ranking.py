@@ -0,0 +1,44 @@
+import unittest
+
+from ranking import DEALS, deal, rank, unrank
+from simulation import reset
+from whist import AI, Game, Player, mask_of
+
+
+def new_game(seed=None):
+    players = [Player('Player %d' % (i + 1), AI()) for i in xrange(4)]
+    return Game(players, verbose=False, seed=seed)
+
+
+class RankingTest(unittest.TestCase):
+
+    def test_deal(self):
+        game = new_game()
+        for number in (0, 1, DEALS / 2, DEALS - 1):
+            deal(game, number)
+            self.assertEqual(rank(game), number)
+            self.assertEqual(
+                unrank(number),
+                ([mask_of(p.hand) for p in game.players], game.dealer,
+                 game.trump))
+
+    def test_game_deals(self):
+        for seed in xrange(5):
+            game = new_game(seed)
+            for dealer in xrange(4):
+                reset(game, dealer)
+                game.deck.shuffle()
+                game.deal()
+                self.assertEqual(
+                    unrank(rank(game)),
+                    ([mask_of(p.hand) for p in game.players], dealer,
+                     game.trump))
+                game.deck.deck = game.deal_order
+
+    def test_out_of_range(self):
+        self.assertRaises(ValueError, unrank, -1)
+        self.assertRaises(ValueError, unrank, DEALS)
+
+
+if __name__ == '__main__':
+    unittest.main()
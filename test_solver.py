@@ -0,0 +1,170 @@
+import random
+import unittest
+
+from whist import AI, CARDS, SUIT_MASKS, Player
+from montecarlo import MonteCarloAI
+from simulation import simulate
+from solver import Solver, _solver
+import tablebase
+
+
+def winning(trick, trump):
+    best = 0
+    for i in xrange(1, 4):
+        card, top = trick[i], trick[best]
+        if card / 13 == top / 13:
+            if card > top:
+                best = i
+        elif card / 13 == trump:
+            best = i
+    return best
+
+
+def minimax(hands, leader, trump, offensive, memo):
+    """
+    Offensive tricks from a trick start, trying every legal card
+    """
+    if not hands[leader]:
+        return 0
+    key = (tuple(hands), leader)
+    if key not in memo:
+        memo[key] = trick_minimax(hands, leader, trump, offensive, memo, [])
+    return memo[key]
+
+
+def trick_minimax(hands, leader, trump, offensive, memo, trick):
+    if len(trick) == 4:
+        winner = (leader + winning(trick, trump)) % 4
+        return (winner in offensive) + minimax(hands, winner, trump,
+                                               offensive, memo)
+    seat = (leader + len(trick)) % 4
+    cards = hands[seat]
+    if trick and cards & SUIT_MASKS[trick[0] / 13]:
+        cards &= SUIT_MASKS[trick[0] / 13]
+    results = []
+    while cards:
+        card = cards & -cards
+        cards ^= card
+        hands[seat] ^= card
+        trick.append(card.bit_length() - 1)
+        results.append(trick_minimax(hands, leader, trump, offensive, memo,
+                                     trick))
+        trick.pop()
+        hands[seat] ^= card
+    return max(results) if seat in offensive else min(results)
+
+
+def random_ending(rng, cards):
+    deck = range(52)
+    rng.shuffle(deck)
+    hands = [sum(1 << card for card in deck[cards * seat:cards * (seat + 1)])
+             for seat in xrange(4)]
+    offensive = rng.choice([(0, 2), (1,), (0, 3), (1, 2, 3), (2, 3)])
+    return hands, rng.randrange(-1, 4), rng.randrange(4), offensive
+
+
+class SolverTest(unittest.TestCase):
+    """
+    The search in Python, the compiled core is tested below
+    """
+
+    def solver(self, trump, offensive):
+        result = Solver(trump, offensive)
+        result.core = None
+        return result
+
+    def check(self, cards, count, seed):
+        rng = random.Random(seed)
+        for i in xrange(count):
+            hands, trump, leader, offensive = random_ending(rng, cards)
+            expected = minimax(list(hands), leader, trump, offensive, {})
+            self.assertEqual(
+                self.solver(trump, offensive).solve(list(hands), leader),
+                expected, (hands, trump, leader, offensive))
+
+    def test_small_endings(self):
+        self.check(3, 300, 1)
+
+    def test_endings(self):
+        self.check(4, 100, 2)
+
+    def test_solver_reuse(self):
+        rng = random.Random(3)
+        for trump in xrange(-1, 4):
+            solver = self.solver(trump, (0, 2))
+            for i in xrange(30):
+                hands = random_ending(rng, 4)[0]
+                self.assertEqual(solver.solve(list(hands), 1),
+                                 minimax(list(hands), 1, trump, (0, 2), {}))
+
+    def test_partial_trick(self):
+        rng = random.Random(4)
+        for i in xrange(200):
+            hands, trump, leader, offensive = random_ending(rng, 4)
+            played = []
+            for j in xrange(i % 4 + 1):
+                seat = (leader + j) % 4
+                cards = hands[seat]
+                if played and cards & SUIT_MASKS[played[0] / 13]:
+                    cards &= SUIT_MASKS[played[0] / 13]
+                card = cards & -cards
+                hands[seat] ^= card
+                played.append(card.bit_length() - 1)
+            solver = self.solver(trump, offensive)
+            trick = [(CARDS[card], (leader + j) % 4)
+                     for j, card in enumerate(played)]
+            expected = trick_minimax(list(hands), leader, trump, offensive,
+                                     {}, played)
+            self.assertEqual(solver.solve(list(hands), leader, trick),
+                             expected, (hands, trump, leader, played))
+
+@unittest.skipIf(_solver is None, 'the _solver extension is not built')
+class CompiledSolverTest(SolverTest):
+
+    def solver(self, trump, offensive):
+        return Solver(trump, offensive)
+
+    def test_longer_endings(self):
+        rng = random.Random(5)
+        for i in xrange(20):
+            hands, trump, leader, offensive = random_ending(rng, 7)
+            python = Solver(trump, offensive)
+            python.core = None
+            self.assertEqual(
+                self.solver(trump, offensive).solve(list(hands), leader),
+                python.solve(list(hands), leader),
+                (hands, trump, leader, offensive))
+
+
+    def test_tablebase(self):
+        rng = random.Random(7)
+        table = tablebase.load()
+        for i in xrange(20):
+            hands, trump, leader, offensive = random_ending(rng, 5)
+            python = Solver(trump, offensive)
+            python.core = None
+            self.assertEqual(
+                Solver(trump, offensive, tablebase=table).solve(
+                    list(hands), leader),
+                python.solve(list(hands), leader))
+
+    def test_bad_position(self):
+        hands = random_ending(random.Random(6), 4)[0]
+        solver = self.solver(-1, (0, 2))
+        short = hands[:3] + [hands[3] & (hands[3] - 1)]
+        self.assertRaises(ValueError, solver.solve, short, 0)
+        overlapping = hands[:3] + [hands[3] | hands[0]]
+        self.assertRaises(ValueError, solver.solve, overlapping, 0)
+        card = hands[1] & -hands[1]
+        self.assertRaises(ValueError, solver.solve, hands, 0,
+                          [(CARDS[card.bit_length() - 1], 0)])
+
+    def test_monte_carlo_deal(self):
+        ais = [MonteCarloAI(samples=3, rng=random.Random(1)), AI(),
+               MonteCarloAI(samples=3, rng=random.Random(2)), AI()]
+        players = [Player('Player %d' % (i + 1), ai)
+                   for i, ai in enumerate(ais)]
+        self.assertEqual(len(simulate(5, players, seed=1)), 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from whist import AI, Game
+from benchmark import new_players, positions
+from simulation import reset
+
+
+def bid_states(deals, bids):
+    """
+    (player, game) for every seat of seeded deals, with bids already made
+    """
+    states = []
+    for seed in xrange(deals):
+        game = Game(new_players(), verbose=False, seed=seed)
+        reset(game, seed % 4)
+        game.deck.shuffle()
+        game.deal()
+        game.bids = list(bids)
+        states += [(player, game) for player in game.players]
+    return states
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class BatchTest(unittest.TestCase):
+
+    def test_play_batch(self):
+        expected = [player.play(game) for game, player in positions(2000)]
+        states = [(player, game) for game, player in positions(2000)]
+        self.assertEqual(AI().play_batch(states), expected)
+
+    def test_bid_batch(self):
+        ai = AI()
+        for bids in ([], ['ask'], ['ask', 'join'], ['pass', 'pass']):
+            expected = [ai.bid(player, game)
+                        for player, game in bid_states(100, bids)]
+            self.assertEqual(ai.bid_batch(bid_states(100, bids)), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
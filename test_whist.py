@@ -0,0 +1,47 @@
+import os
+import pickle
+import sys
+import unittest
+import warnings
+
+import bidding
+from whist import CARDS, Hand, data_path
+
+
+class HandTest(unittest.TestCase):
+
+    def test_pickle(self):
+        for hand in [Hand(), Hand(CARDS[:13]), Hand(mask=1 << 51)]:
+            for protocol in xrange(pickle.HIGHEST_PROTOCOL + 1):
+                copy = pickle.loads(pickle.dumps(hand, protocol))
+                self.assertEqual(copy.mask, hand.mask)
+
+
+
+class DataTest(unittest.TestCase):
+
+    def test_data_path(self):
+        self.assertTrue(os.path.exists(data_path('bidding.json')))
+        sys.frozen = 'macosx_app'
+        os.environ['RESOURCEPATH'] = '/Resources'
+        try:
+            self.assertEqual(data_path('endgames.tb'),
+                             '/Resources/endgames.tb')
+        finally:
+            del sys.frozen
+            del os.environ['RESOURCEPATH']
+
+    def test_missing_bidding_table(self):
+        table, bidding._table = bidding._table, None
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                self.assertEqual(bidding.load_table('missing.json'),
+                                 {'fine': {}, 'coarse': {}})
+            self.assertEqual(len(caught), 1)
+        finally:
+            bidding._table = table
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import itertools
+import math
+import multiprocessing
+from collections import namedtuple
+
+from whist import Game, GameMode, Player
+from simulation import new_seed, play_deal
+
+
+MatchResult = namedtuple('MatchResult', ('pairs', 'wins', 'losses', 'draws',
+                                         'llr', 'winner'))
+
+
+def seat_score(result, seat):
+    """
+    1 when seat ended up on the winning side of a DealResult, else 0
+    """
+    offensive = seat in result.offensive
+    return int(offensive == (result.winning_side == GameMode.OFFENSIVE))
+
+
+def play_pair(game_a, game_b, seed, index, score=seat_score):
+    """
+    Play deal index with a's players in seats 0 and 2, then the same deal
+    with b's players there, returns how many more points a made than b
+    """
+    first = play_deal(game_a, seed, index)
+    second = play_deal(game_b, seed, index)
+    a = score(first, 0) + score(first, 2) + score(second, 1) + \
+        score(second, 3)
+    b = score(first, 1) + score(first, 3) + score(second, 0) + \
+        score(second, 2)
+    return a - b
+
+
+def duplicate_games(ai_a, ai_b):
+    """
+    Two silent games, with a in seats 0 and 2 of the first and in seats 1
+    and 3 of the second
+    """
+    first = [Player('A1', ai_a), Player('B1', ai_b),
+             Player('A2', ai_a), Player('B2', ai_b)]
+    second = [Player('B1', ai_b), Player('A1', ai_a),
+              Player('B2', ai_b), Player('A2', ai_a)]
+    return Game(first, verbose=False), Game(second, verbose=False)
+
+
+def _play_pairs(args):
+    ai_a, ai_b, score, seed, start, count = args
+    game_a, game_b = duplicate_games(ai_a, ai_b)
+    return [play_pair(game_a, game_b, seed, i, score)
+            for i in xrange(start, start + count)]
+
+
+class SPRT(object):
+    """
+    Sequential probability ratio test on the pairs a match has decided
+
+    Tests whether a wins decisive pairs with probability 0.5 + delta or
+    0.5 - delta, with error rates alpha and beta.
+    """
+
+    def __init__(self, delta=0.05, alpha=0.05, beta=0.05):
+        self.win = math.log((0.5 + delta) / (0.5 - delta))
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.llr = 0.0
+
+    def add(self, diff):
+        if diff > 0:
+            self.llr += self.win
+        elif diff < 0:
+            self.llr -= self.win
+
+    def verdict(self):
+        """
+        'a' or 'b' once the test is settled, None before
+        """
+        if self.llr >= self.upper:
+            return 'a'
+        if self.llr <= self.lower:
+            return 'b'
+        return None
+
+
+def match(ai_a, ai_b, max_pairs=100000, seed=None, processes=None,
+          chunksize=50, score=seat_score, **sprt):
+    """
+    Play duplicate pairs of deals between two AIs until an SPRT settles
+    which is stronger or max_pairs pairs are played
+
+    Pairs are played in chunks on a pool of worker processes and counted in
+    deal order, so the result only depends on seed and not on the number
+    of processes. winner is 'a', 'b' or None when max_pairs ran out first.
+    score(deal result, seat) gives the points of a seat, it has to be a
+    module level function so it can be sent to the workers.
+    """
+    seed = new_seed() if seed is None else seed
+    test = SPRT(**sprt)
+    chunks = ((ai_a, ai_b, score, seed, start,
+               min(chunksize, max_pairs - start))
+              for start in xrange(0, max_pairs, chunksize))
+    wins = losses = draws = 0
+    pool = multiprocessing.Pool(processes)
+    try:
+        for diffs in pool.imap(_play_pairs, chunks):
+            for diff in diffs:
+                test.add(diff)
+                wins += diff > 0
+                losses += diff < 0
+                draws += diff == 0
+                winner = test.verdict()
+                if winner:
+                    return MatchResult(wins + losses + draws, wins, losses,
+                                       draws, test.llr, winner)
+        return MatchResult(wins + losses + draws, wins, losses, draws,
+                           test.llr, None)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def tournament(ais, **options):
+    """
+    Match every two of a dict of named AIs, returns the MatchResult of
+    every (name, name) pair and the number of matches each AI won
+    """
+    results = {}
+    standings = dict((name, 0) for name in ais)
+    for a, b in itertools.combinations(sorted(ais), 2):
+        result = match(ais[a], ais[b], **options)
+        results[a, b] = result
+        if result.winner:
+            standings[a if result.winner == 'a' else b] += 1
+    return results, standings
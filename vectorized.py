@@ -0,0 +1,292 @@
+import numpy as np
+
+import bidding
+import records
+from whist import BIDS, SUIT_MASKS, SUIT_ORDER
+
+
+PACKETS = (4, 4, 5)
+
+
+def _deal_positions():
+    """
+    Deck positions each seat receives, indexed by seat relative to the
+    dealer, following Game.deal: packets of 4, 4 and 5 cards going round
+    the table starting left of the dealer
+    """
+    positions = [[] for relative in xrange(4)]
+    position = 0
+    for size in PACKETS:
+        for relative in (1, 2, 3, 0):
+            positions[relative] += range(position, position + size)
+            position += size
+    return np.array(positions)
+
+
+DEAL_POSITIONS = _deal_positions()
+# DEAL_ORDER[dealer] maps every seat to the deck positions it receives
+DEAL_ORDER = np.array([DEAL_POSITIONS[(np.arange(4) - dealer) % 4]
+                       for dealer in xrange(4)])
+
+
+def random_state(rng=None):
+    if isinstance(rng, np.random.RandomState):
+        return rng
+    return np.random.RandomState(rng)
+
+
+def shuffle_batch(n, rng=None):
+    """
+    (n, 52) array of card indexes, every row a deck after Deck.shuffle and
+    Deck.hef_af: a random permutation cut at a random height
+    """
+    rng = random_state(rng)
+    decks = np.argsort(rng.random_sample((n, 52)), axis=1).astype(np.int8)
+    heights = rng.randint(0, 52, size=n)
+    cut = (np.arange(52)[np.newaxis, :] + heights[:, np.newaxis]) % 52
+    return np.take_along_axis(decks, cut, axis=1)
+
+
+def deal_batch(n, dealer=0, rng=None, decks=None):
+    """
+    Deal n games at once like Game.deal
+
+    dealer is a seat or an array with a seat per game. Returns an (n, 4, 13)
+    array with the card indexes every seat receives, in the order they are
+    dealt, and an (n,) array with the trump card: the dealer's last card.
+    """
+    if decks is None:
+        decks = shuffle_batch(n, rng)
+    dealer = np.asarray(dealer)
+    if dealer.ndim == 0:
+        hands = decks[:, DEAL_ORDER[dealer]]
+    else:
+        order = DEAL_ORDER[dealer].reshape(len(decks), 52)
+        hands = np.take_along_axis(decks, order, axis=1).reshape(-1, 4, 13)
+    return hands, decks[:, 51]
+
+
+def hand_masks(hands):
+    """
+    Card masks for an (..., 13) array of card indexes, as in Hand.mask
+    """
+    bits = np.left_shift(np.uint64(1), hands.astype(np.uint64))
+    return np.bitwise_or.reduce(bits, axis=-1)
+
+
+CARD_SUIT = np.arange(52) / 13
+CARD_RANK = np.arange(52) % 13
+CARD_BITS = np.arange(52, dtype=np.uint64)
+ONE = np.uint64(1)
+# SUIT_MASKS by suit, with an empty mask at -1 for no suit
+SUIT_MASK_ARRAY = np.array(SUIT_MASKS + (0,), dtype=np.uint64)
+# Position of every suit in SUIT_ORDER, and of every card in a Hand
+SUIT_POSITION = np.array([SUIT_ORDER.index(suit) for suit in xrange(4)])
+HAND_POSITION = SUIT_POSITION[CARD_SUIT] * 13 + CARD_RANK
+HONOUR_POINTS = np.zeros(13, dtype=int)
+for rank, points in bidding.HONOURS:
+    HONOUR_POINTS[rank] = points
+
+
+def card_bits(masks):
+    """
+    (n, 52) boolean array of the cards in an (n,) array of card masks
+    """
+    masks = np.asarray(masks, dtype=np.uint64)
+    return (masks[:, np.newaxis] >> CARD_BITS & ONE).astype(bool)
+
+
+def _top(masks):
+    """
+    Index of the highest bit of every mask, -1 for empty ones
+    """
+    return np.frexp(masks.astype(np.float64))[1] - 1
+
+
+def _bottom(masks):
+    return _top(masks & (~masks + ONE))
+
+
+def _fold(masks):
+    """
+    Fold the suits of every mask onto a 13-bit rank mask, as rank_mask
+    """
+    return (masks | masks >> np.uint64(13) | masks >> np.uint64(26) |
+            masks >> np.uint64(39)) & np.uint64(0x1fff)
+
+
+def _in_suits(masks, ranks, suits):
+    """
+    Card of rank ranks in the first of suits that masks hold it in
+    """
+    cards = np.full(len(masks), -1, dtype=int)
+    for suit in reversed(suits):
+        card = np.maximum(13 * suit + ranks, 0)
+        held = (masks >> card.astype(np.uint64) & ONE).astype(bool)
+        cards = np.where(held & (ranks >= 0), card, cards)
+    return cards
+
+
+def play_batch(hands, trumps, leads, tricks):
+    """
+    Card indexes AI.play picks for n decisions at once
+
+    hands is an (n,) array of card masks, trumps an (n,) array of trump
+    suits, leads an (n,) array with the card led to the current trick or -1
+    and tricks an (n,) array with the masks of the cards in the trick.
+    """
+    hands = np.asarray(hands, dtype=np.uint64)
+    trumps = np.asarray(trumps, dtype=int)
+    leads = np.asarray(leads, dtype=int)
+    tricks = np.asarray(tricks, dtype=np.uint64)
+    leading = leads < 0
+    lead = np.where(leading, -1, leads / 13)
+    trump_mask = SUIT_MASK_ARRAY[trumps]
+
+    # The card winning the trick: the highest trump or else the highest
+    # card of the suit led
+    trumped = tricks & trump_mask
+    best = np.maximum(np.where(trumped != 0, _top(trumped),
+                               _top(tricks & SUIT_MASK_ARRAY[lead])), 0)
+    best_suit = best / 13
+    beats = SUIT_MASK_ARRAY[best_suit] & \
+        ~((ONE << (best + 1).astype(np.uint64)) - ONE)
+    beats |= np.where(best_suit != trumps, trump_mask, np.uint64(0))
+
+    in_suit = hands & SUIT_MASK_ARRAY[lead]
+    trump_cards = hands & trump_mask
+    winning_in_suit = in_suit & beats
+    winning_trumps = trump_cards & beats
+    top_trump = _top(trump_cards)
+
+    ranks = _fold(hands)
+    highest_rank = _in_suits(hands, _top(ranks), SUIT_ORDER[::-1])
+    lowest_rank = _in_suits(hands, _bottom(ranks), SUIT_ORDER)
+    # The cheapest card when trumps count double, ties go to the card that
+    # comes first in the hand
+    side = hands & ~trump_mask
+    side_card = _in_suits(side, _bottom(_fold(side)), SUIT_ORDER)
+    trump_card = _bottom(trump_cards)
+    side_key = np.where(side_card >= 0,
+                        (side_card % 13) * 64 + HAND_POSITION[side_card],
+                        1 << 12)
+    trump_key = (trump_card % 13) * 128 + HAND_POSITION[trump_card]
+    cheapest = np.where(side_key < trump_key, side_card, trump_card)
+
+    return np.select(
+        [leading & (trump_cards != 0) & (top_trump % 13 > 8),
+         leading,
+         winning_in_suit != 0,
+         in_suit != 0,
+         winning_trumps != 0,
+         trump_cards != 0],
+        [top_trump, highest_rank, _top(winning_in_suit), _bottom(in_suit),
+         _top(winning_trumps), cheapest],
+        lowest_rank)
+
+
+def signatures(hands, trumps):
+    """
+    (n, 6) array with the bidding.signature of n hands (card masks) for
+    their trump suits
+    """
+    held = card_bits(hands)
+    trumps = np.asarray(trumps)[:, np.newaxis]
+    is_trump = CARD_SUIT == trumps
+    trump_cards = held & is_trump
+    side = held & ~is_trump
+    lengths = held.reshape(-1, 4, 13).sum(axis=2)
+    side_suit = np.arange(4) != trumps
+    return np.column_stack((
+        trump_cards.sum(axis=1),
+        (trump_cards * HONOUR_POINTS[CARD_RANK]).sum(axis=1),
+        np.where(side_suit, lengths, -1).max(axis=1),
+        np.where(side_suit, lengths, 14).min(axis=1),
+        (side & (CARD_RANK == 12)).sum(axis=1),
+        (side & (CARD_RANK == 11)).sum(axis=1)))
+
+
+def _signature_keys(signatures):
+    """
+    One integer per signature, four bits per field
+    """
+    signatures = np.asarray(signatures, dtype=np.int64)
+    return (signatures << (4 * np.arange(signatures.shape[1]))).sum(axis=1)
+
+
+_bidding_arrays = None
+
+
+def bidding_arrays():
+    """
+    The bidding table as sorted signature keys with their mean tricks and
+    sample counts, per level
+    """
+    global _bidding_arrays
+    if _bidding_arrays is None:
+        _bidding_arrays = {}
+        for level, entries in bidding.load_table().iteritems():
+            keys = list(entries)
+            codes = _signature_keys(keys) if keys else np.zeros(0, np.int64)
+            means = np.array([entries[key][0] for key in keys])
+            counts = np.array([entries[key][1] for key in keys], dtype=int)
+            order = np.argsort(codes)
+            _bidding_arrays[level] = (codes[order], means[order],
+                                      counts[order])
+    return _bidding_arrays
+
+
+def _lookup(level, codes):
+    keys, means, counts = bidding_arrays()[level]
+    if not len(keys):
+        return np.zeros(len(codes), dtype=bool), np.zeros(len(codes)), \
+            np.zeros(len(codes), dtype=int)
+    at = np.minimum(np.searchsorted(keys, codes), len(keys) - 1)
+    return keys[at] == codes, means[at], counts[at]
+
+
+def expected_tricks_batch(hands, trumps):
+    """
+    (n,) array of bidding.expected_tricks for n hands, NaN where the table
+    has nothing
+    """
+    fine = signatures(hands, trumps)
+    found, means, counts = _lookup('fine', _signature_keys(fine))
+    found &= counts >= bidding.MIN_SAMPLES
+    coarse_found, coarse_means, counts = _lookup(
+        'coarse', _signature_keys(fine[:, [0, 1, 4]]))
+    return np.where(found, means,
+                    np.where(coarse_found, coarse_means, np.nan))
+
+
+def bid_batch(hands, trumps, can_ask, can_join, ask_tricks, join_tricks):
+    """
+    Indexes in BIDS of the bids AI.bid makes for n hands at once, -1 where
+    the table has nothing and the first possible bid is made
+
+    can_ask and can_join are (n,) boolean arrays of the bids still possible.
+    """
+    tricks = expected_tricks_batch(hands, trumps)
+    with np.errstate(invalid='ignore'):
+        ask = np.asarray(can_ask) & (tricks >= ask_tricks)
+        join = np.asarray(can_join) & (tricks >= join_tricks)
+    return np.select([np.isnan(tricks), ask, join],
+                     [-1, BIDS.index('ask'), BIDS.index('join')],
+                     BIDS.index('pass'))
+
+
+RECORD_DTYPE = np.dtype([('dealer', np.uint8), ('deck', np.uint8, 52),
+                         ('trump', np.uint8), ('bids', np.uint8, 4),
+                         ('plays', np.uint8, 52), ('winning_side', np.uint8),
+                         ('offensive_tricks', np.uint8)])
+
+
+def load_records(path):
+    """
+    Structured array over a file of records.RecordWriter records, mapped
+    from disk rather than read, to scan whole columns at once
+    """
+    with records.RecordReader(path) as reader:
+        count = len(reader)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r',
+                     offset=records.HEADER.size, shape=(count,))
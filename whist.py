@@ -1,6 +1,10 @@
+import os
 import random
 import sys
 
+from instrumentation import monotonic
+from rng import CounterRandom
+
 
 RANKS = ('2', '3', '4', '5', '6', '7', '8', '9', '10', 'jack', 'queen', 'king',
          'ace')
@@ -10,7 +14,7 @@ BIDS = ('ask', 'join', 'pass')
 
 class Card(object):
     """
-    Represents a playing card
+    Represents a playing card, its index is suit * 13 + rank
     """
 
     def __init__(self, rank, suit):
@@ -19,6 +23,17 @@ class Card(object):
                               SUITS[suit][0].upper())
         self.rank = rank
         self.suit = suit
+        self.index = suit * 13 + rank
+        self.mask = 1 << self.index
+
+    def __eq__(self, other):
+        return isinstance(other, Card) and self.index == other.index
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return self.index
 
     def __repr__(self):
         return '<Card: %s>' % self.name
@@ -27,6 +42,156 @@ class Card(object):
         return self.name
 
 
+CARDS = tuple(Card(i % 13, i / 13) for i in xrange(52))
+SUIT_MASKS = tuple(0x1fff << (13 * suit) for suit in xrange(4))
+SUIT_ORDER = (0, 2, 1, 3)   # Order in which suits are shown in a hand
+
+
+def data_path(name):
+    """
+    Path of a data file shipped with the code, in the Resources folder of
+    an app bundle built by py2app, where the code itself is zipped
+    """
+    if getattr(sys, 'frozen', None) and 'RESOURCEPATH' in os.environ:
+        return os.path.join(os.environ['RESOURCEPATH'], name)
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+def lowest_card(mask):
+    """
+    Card of the lowest bit in mask, None if mask is empty
+    """
+    return CARDS[(mask & -mask).bit_length() - 1] if mask else None
+
+
+def highest_card(mask):
+    """
+    Card of the highest bit in mask, None if mask is empty
+    """
+    return CARDS[mask.bit_length() - 1] if mask else None
+
+
+def rank_mask(mask):
+    """
+    Fold the four suits of mask onto one 13-bit rank mask
+    """
+    return (mask | mask >> 13 | mask >> 26 | mask >> 39) & 0x1fff
+
+
+def lowest_rank_card(mask):
+    """
+    Card of the lowest rank in mask, ties go to the first suit shown
+    """
+    ranks = rank_mask(mask)
+    rank = (ranks & -ranks).bit_length() - 1
+    for suit in SUIT_ORDER:
+        if mask >> (13 * suit + rank) & 1:
+            return CARDS[13 * suit + rank]
+
+
+def highest_rank_card(mask):
+    """
+    Card of the highest rank in mask, ties go to the last suit shown
+    """
+    rank = rank_mask(mask).bit_length() - 1
+    for suit in reversed(SUIT_ORDER):
+        if mask >> (13 * suit + rank) & 1:
+            return CARDS[13 * suit + rank]
+
+
+def cards_of(mask):
+    """
+    List of the cards in mask, by suit in SUIT_ORDER and then by rank
+    """
+    cards = []
+    for suit in SUIT_ORDER:
+        suit_mask = mask & SUIT_MASKS[suit]
+        while suit_mask:
+            low = suit_mask & -suit_mask
+            cards.append(CARDS[low.bit_length() - 1])
+            suit_mask ^= low
+    return cards
+
+
+def mask_of(cards):
+    """
+    Mask of a Hand or of any iterable of cards
+    """
+    if isinstance(cards, Hand):
+        return cards.mask
+    mask = 0
+    for card in cards:
+        mask |= card.mask
+    return mask
+
+
+class Hand(object):
+    """
+    A set of cards stored as a 52-bit mask
+
+    Behaves like the sorted list of its cards, so it can be indexed, iterated
+    and popped from like the plain lists hands used to be.
+    """
+    __slots__ = ('mask',)
+
+    def __init__(self, cards=(), mask=0):
+        self.mask = mask | mask_of(cards)
+
+    def __len__(self):
+        return popcount(self.mask)
+
+    def __nonzero__(self):
+        return self.mask != 0
+
+    def __iter__(self):
+        return iter(cards_of(self.mask))
+
+    def __getitem__(self, i):
+        return cards_of(self.mask)[i]
+
+    def __contains__(self, card):
+        return isinstance(card, Card) and bool(self.mask & card.mask)
+
+    def __iadd__(self, cards):
+        self.mask |= mask_of(cards)
+        return self
+
+    def index(self, card):
+        return cards_of(self.mask).index(card)
+
+    def append(self, card):
+        self.mask |= card.mask
+
+    def remove(self, card):
+        if not self.mask & card.mask:
+            raise ValueError('%s not in hand' % card)
+        self.mask ^= card.mask
+
+    def pop(self, i=-1):
+        return self.take(self[i])
+
+    def take(self, card):
+        """
+        Remove card from the hand and return it
+        """
+        self.remove(card)
+        return card
+
+    def __getstate__(self):
+        # A tuple, pickle skips __setstate__ for a false state like 0
+        return (self.mask,)
+
+    def __setstate__(self, state):
+        self.mask, = state
+
+    def __repr__(self):
+        return '<Hand: %s>' % ', '.join(map(str, self))
+
+
 def find_card_from_string(s, cards):
     if ' of ' in s:
         rank_str, suit_str = s.split(' of ')
@@ -42,14 +207,22 @@ def find_card_from_string(s, cards):
 
 
 class Deck(object):
-    def __init__(self):
-        self.deck = [Card(i % 13, i / 13) for i in xrange(52)]
+    """
+    Shuffles with rng, a rng.CounterRandom stream when a seed is given and
+    the random module otherwise, its shuffle is the cheaper one
+    """
+
+    def __init__(self, rng=None, seed=None):
+        self.deck = list(CARDS)
+        if rng is None:
+            rng = random if seed is None else CounterRandom(seed)
+        self.rng = rng
 
     def shuffle(self):
-        random.shuffle(self.deck)
+        self.rng.shuffle(self.deck)
 
     def hef_af(self, height=-1):
-        height = height >= 0 and height or random.randrange(52)
+        height = height >= 0 and height or self.rng.randrange(52)
         self.deck = self.deck[height:] + self.deck[:height]
 
     def pop(self, count):
@@ -61,6 +234,7 @@ class Deck(object):
 class Trick(object):
     def __init__(self):
         self.played_cards = []
+        self.mask = 0
 
     def suit(self):
         if len(self.played_cards) > 0:
@@ -69,13 +243,22 @@ class Trick(object):
 
     def play(self, card, player):
         self.played_cards.append((card, player))
+        self.mask |= card.mask
 
     def sort(self, trump=-1):
         return sorted(self.played_cards,
                       key=lambda p: self.sort_key(p[0], trump))
 
     def winning(self, trump=-1):
-        return self.sort(trump)[-1]
+        winning = self.played_cards[0]
+        for played in self.played_cards[1:]:
+            card, best = played[0], winning[0]
+            if card.suit == best.suit:
+                if card.rank > best.rank:
+                    winning = played
+            elif card.suit == trump:
+                winning = played
+        return winning
 
     def sort_key(self, card, trump=-1):
         suit_rank = 0
@@ -86,17 +269,29 @@ class Trick(object):
             suit_rank = 1
         return suit_rank * 13 + card.rank
 
-    def winning_cards(self, cards, trump):
+    def winning_mask(self, mask, trump=-1):
+        """
+        The cards of mask that would beat the card currently winning
+        """
         if len(self.played_cards) == 0:
-            return []
-        winning = self.sort_key(self.winning(trump)[0], trump)
-        return [card for card in cards if self.sort_key(card, trump) > winning]
+            return 0
+        best = self.winning(trump)[0]
+        higher = mask & SUIT_MASKS[best.suit] & ~((best.mask << 1) - 1)
+        if best.suit != trump and 0 <= trump < 4:
+            higher |= mask & SUIT_MASKS[trump]
+        return higher
+
+    def winning_cards(self, cards, trump):
+        return cards_of(self.winning_mask(mask_of(cards), trump))
 
 
 class GameMode(object):
     NORMAL = 'normal'
+    OFFENSIVE = 'offensive'
+    DEFENSIVE = 'defensive'
     offensive = None        # Player(s) on the offensive side
     defensive = None        # Players on the defensive side
+    winning_side = None     # OFFENSIVE or DEFENSIVE, set by post_game
 
     def __init__(self, players, proposals):
         self.offensive = []
@@ -112,9 +307,9 @@ class GameMode(object):
         self.offensive_names = [player.name for player in self.offensive]
         self.defensive_names = [player.name for player in self.defensive]
 
-    def post_game(self):
+    def post_game(self, verbose=True):
         """
-        Decide who won
+        Decide who won, returns the winning side
         """
         winners = []
         winning_count = 0
@@ -123,13 +318,17 @@ class GameMode(object):
             for player in self.offensive:
                 count += player.trick_count()
             if count >= 8:
+                self.winning_side = self.OFFENSIVE
                 winners = self.offensive_names
                 winning_count = count
             else:
+                self.winning_side = self.DEFENSIVE
                 winners = self.defensive_names
                 winning_count = 13 - count
-        print('Yay! %s won with %d tricks.' %
-              (' and '.join(winners), winning_count))
+        if verbose:
+            print('Yay! %s won with %d tricks.' %
+                  (' and '.join(winners), winning_count))
+        return self.winning_side
 
 
     def __repr__(self):
@@ -138,10 +337,60 @@ class GameMode(object):
                                                ', '.join(self.defensive_names))
 
 
+class Knowledge(object):
+    """
+    What the whole table knows about the cards of a deal, updated by Game
+    as every card is played so AIs don't have to go over the tricks
+
+    played is the mask of the cards played so far, voids[seat] the mask of
+    the suits seat has shown out of, masters[suit] the highest card of the
+    suit that is still out (None once the suit is played out) and
+    trumps_left the number of trumps still out.
+    """
+
+    def __init__(self, trump=-1):
+        self.trump = trump
+        self.played = 0
+        self.voids = [0] * 4
+        self.masters = [CARDS[13 * suit + 12] for suit in xrange(4)]
+        self.trumps_left = 13 if 0 <= trump < 4 else 0
+
+    def play(self, card, seat, led=-1):
+        """
+        Record card played by seat to a trick led in suit led, -1 when
+        the card leads it
+        """
+        self.played |= card.mask
+        suit = card.suit
+        if led >= 0 and suit != led:
+            self.voids[seat] |= SUIT_MASKS[led]
+        if suit == self.trump:
+            self.trumps_left -= 1
+        if card == self.masters[suit]:
+            self.masters[suit] = highest_card(SUIT_MASKS[suit] &
+                                              ~self.played)
+
+    def played_in(self, suit):
+        """
+        Mask of the cards of suit played so far
+        """
+        return self.played & SUIT_MASKS[suit]
+
+    def is_void(self, seat, suit):
+        return bool(self.voids[seat] & SUIT_MASKS[suit])
+
+    def __repr__(self):
+        return '<Knowledge: %d played, %d trumps left>' % (
+            popcount(self.played), self.trumps_left)
+
+
 class Game(object):
-    def __init__(self, players):
-        self.deck = Deck()
+    def __init__(self, players, rng=None, verbose=True, observers=(),
+                 seed=None):
+        self.deck = Deck(rng, seed)
         self.players = players
+        self.verbose = verbose
+        self.observers = list(observers)    # instrumentation.Observer
         self.dealer = 0
         self.trump = None
         self.playing = 1
@@ -149,6 +398,8 @@ class Game(object):
         self.trick = None
         self.mode = None
         self.bids = []
+        self.deal_order = []    # The deck as it was dealt
+        self.knowledge = Knowledge()
 
     def start(self):
         self.deck.shuffle()
@@ -156,7 +407,15 @@ class Game(object):
         self.deal()
         self.bidding()
 
+    def notify(self, event, *args):
+        t = monotonic()
+        for observer in self.observers:
+            getattr(observer, event)(self, t, *args)
+
     def deal(self):
+        if self.observers:
+            self.notify('deal_start')
+        self.deal_order = list(self.deck.deck)
         p = (self.dealer + 1) % 4
 
         for i in xrange(4):
@@ -168,13 +427,16 @@ class Game(object):
             p = (p + 1) % 4
 
         for i in xrange(4):
-            self.players[p].hand += self.deck.pop(5)
+            packet = self.deck.pop(5)
+            self.players[p].hand += packet
             if i == 3:
-                self.trump = self.players[p].hand[-1]
-            self.players[p].sort()
+                self.trump = packet[-1]
             p = (p + 1) % 4
+        self.knowledge = Knowledge(self.trump.suit)
 
     def collect(self):
+        if self.observers:
+            self.notify('deal_end')
         for trick in self.tricks:
             for played_card in trick.played_cards:
                 self.deck.deck.append(played_card[0])
@@ -185,36 +447,92 @@ class Game(object):
         self.playing = (self.dealer + 1) % 4
 
     def round(self):
-        print('---')
+        if self.verbose:
+            print('---')
         self.trick = Trick()
+        self.finish_trick()
 
-        for i in xrange(4):
+    def finish_trick(self):
+        """
+        Let the players complete the current trick and give it to its winner
+        """
+        for turn in self.trick_turns():
+            pass
+
+    def turns(self):
+        """
+        Deal, bid and play a whole deal as a generator
+
+        Yields (player, 'bid') or (player, 'play') before every decision, so
+        whoever drives the deal can get the decision ready or wait for it
+        before resuming. The deal is scored at the end, but not collected.
+        """
+        self.deck.shuffle()
+        self.deck.hef_af()
+        self.deal()
+        for turn in self.bidding_turns():
+            yield turn
+        while len(self.players[self.playing].hand) > 0:
+            if self.verbose:
+                print('---')
+            self.trick = Trick()
+            for turn in self.trick_turns():
+                yield turn
+        self.post_game(self.verbose)
+
+    def trick_turns(self):
+        while len(self.trick.played_cards) < 4:
             player = self.players[self.playing]
+            yield player, 'play'
             played_card = player.play(self)
+            led = self.trick.suit()
             self.trick.play(played_card, player)
+            self.knowledge.play(played_card, self.playing, led)
             self.playing = (self.playing + 1) % 4
 
-        winning_card, winning_player = self.trick.winning(self.trump.suit)
-        print('%s gets the trick' % winning_player)
-        self.tricks.append(self.trick)
-        winning_player.tricks.append(self.trick)
+        if self.observers:
+            start = monotonic()
+        trick = self.trick
+        winning_card, winning_player = trick.winning(self.trump.suit)
+        self.tricks.append(trick)
+        winning_player.tricks.append(trick)
         self.trick = None
         self.playing = self.players.index(winning_player)
+        if self.observers:
+            self.notify('trick_won', winning_player, trick,
+                        monotonic() - start)
+        if self.verbose:
+            print('%s gets the trick' % winning_player)
+
+    def post_game(self, verbose=True):
+        """
+        Score the deal, returns the winning side
+        """
+        if not self.observers:
+            return self.mode.post_game(verbose)
+        start = monotonic()
+        winning_side = self.mode.post_game(verbose)
+        self.notify('post_game', winning_side, monotonic() - start)
+        return winning_side
 
     def valid_cards(self, hand):
         if len(self.trick.played_cards) == 0:
             return hand
-        suit = self.trick.played_cards[0][0].suit
-        hand_in_suit = [c for c in hand if c.suit == suit]
-        if hand_in_suit:
-            return hand_in_suit
+        in_suit = mask_of(hand) & SUIT_MASKS[self.trick.suit()]
+        if in_suit:
+            return Hand(mask=in_suit)
         return hand
 
     def bidding(self):
+        for turn in self.bidding_turns():
+            pass
+
+    def bidding_turns(self):
         self.bids = []
         players = []
         bidding_player = (self.dealer + 1) % 4
         for i in xrange(4):
+            yield self.players[bidding_player], 'bid'
             bid = self.players[bidding_player].bid(self)
             players.append(self.players[bidding_player])
             self.bids.append(bid)
@@ -237,33 +555,54 @@ class Game(object):
 
 class Player(object):
     def __init__(self, name, ai):
-        self.hand = []
+        self.hand = Hand()
         self.name = name
         self.ai = ai
         self.tricks = []
 
+    @property
+    def hand(self):
+        return self._hand
+
+    @hand.setter
+    def hand(self, cards):
+        self._hand = cards if isinstance(cards, Hand) else Hand(cards)
+
     def sort(self):
-        self.hand = sum((self.sorted_suit(i) for i in (0, 2, 1, 3)), [])
+        """
+        Hands are always kept sorted, nothing to do
+        """
 
     def sorted_suit(self, suit, hand=None):
         hand = hand or self.hand
-        return sorted((c for c in hand if c.suit == suit),
-                      key=lambda card: card.rank)
+        return cards_of(mask_of(hand) & SUIT_MASKS[suit])
 
     def highest(self, suit):
-        return self.sorted_suit(suit)[-1]
+        return highest_card(self.hand.mask & SUIT_MASKS[suit])
 
     def lowest(self, suit):
-        return self.sorted_suit(suit)[0]
+        return lowest_card(self.hand.mask & SUIT_MASKS[suit])
 
     def play(self, game):
-        card = self.ai.play(self, game)
-        print('%s plays %s.' % (self.name, card))
+        if game.observers:
+            start = monotonic()
+            card = self.ai.play(self, game)
+            game.notify('card_played', self, card, monotonic() - start)
+        else:
+            card = self.ai.play(self, game)
+        if game.verbose:
+            print('%s plays %s.' % (self.name, card))
         return card
 
     def bid(self, game):
-        bid = self.ai.bid(self, game)
-        print('%s proposes %s.' % (self.name, bid))
+        if game.observers:
+            start = monotonic()
+            bid = self.ai.bid(self, game)
+            game.notify('bid', self, bid, monotonic() - start)
+        else:
+            bid = self.ai.bid(self, game)
+        if game.verbose:
+            print('%s proposes %s.' % (self.name, bid))
         return bid
 
     def valid_cards(self, game):
@@ -282,48 +621,105 @@ class Player(object):
 
 class AI(object):
     def play(self, player, game):
+        hand = player.hand
+        trump = game.trump.suit
         if len(game.trick.played_cards) > 0:
-            in_suits = player.sorted_suit(game.trick.played_cards[0][0].suit)
-            if in_suits:
-                winning_cards = game.trick.winning_cards(in_suits,
-                                                         game.trump.suit)
-                if winning_cards:
-                    return player.hand.pop(
-                        player.hand.index(winning_cards[-1]))
+            in_suit = hand.mask & SUIT_MASKS[game.trick.suit()]
+            if in_suit:
+                winning = game.trick.winning_mask(in_suit, trump)
+                if winning:
+                    return hand.take(highest_card(winning))
                 else:
-                    return player.hand.pop(player.hand.index(in_suits[0]))
-            trumps = player.sorted_suit(game.trump.suit)
+                    return hand.take(lowest_card(in_suit))
+            trumps = hand.mask & SUIT_MASKS[trump]
             if trumps:
-                winning_cards =\
-                    game.trick.winning_cards(trumps, game.trump.suit)
-                if winning_cards:
-                    return player.hand.pop(
-                        player.hand.index(winning_cards[-1]))
+                winning = game.trick.winning_mask(trumps, trump)
+                if winning:
+                    return hand.take(highest_card(winning))
                 else:
-                    lowest_non_trump = sorted(
-                        player.hand,
-                        key=lambda c: c.rank * (2 if c.suit == game.trump.suit
-                                                else 1))[0]
-                    return player.hand.pop(player.hand.index(lowest_non_trump))
-            lowest = sorted(player.hand, key=lambda c: c.rank)[0]
-            return player.hand.pop(player.hand.index(lowest))
+                    lowest_non_trump = min(
+                        hand, key=lambda c: c.rank * (2 if c.suit == trump
+                                                      else 1))
+                    return hand.take(lowest_non_trump)
+            return hand.take(lowest_rank_card(hand.mask))
         else:
-            trumps = player.sorted_suit(game.trump.suit)
-            if trumps and trumps[-1].rank > 8:
-                return player.hand.pop(player.hand.index(trumps[-1]))
-            highest = sorted(player.hand, key=lambda c: c.rank)[-1]
-            return player.hand.pop(player.hand.index(highest))
+            trumps = hand.mask & SUIT_MASKS[trump]
+            if trumps and highest_card(trumps).rank > 8:
+                return hand.take(highest_card(trumps))
+            return hand.take(highest_rank_card(hand.mask))
+
+    def play_batch(self, states):
+        """
+        Play for many (player, game) decision points at once, picking and
+        taking the cards play would
+
+        The choices are computed for all states together with NumPy, which
+        saves the per call overhead when many tables are playing. Subclasses
+        that play differently get one play call per state.
+        """
+        import vectorized
+
+        states = list(states)
+        if type(self).play.im_func is not AI.play.im_func:
+            return [self.play(player, game) for player, game in states]
+        if not states:
+            return []
+        hands, trumps, leads, tricks = [], [], [], []
+        for player, game in states:
+            trick = game.trick
+            hands.append(player.hand.mask)
+            trumps.append(game.trump.suit)
+            leads.append(trick.played_cards[0][0].index
+                         if trick.played_cards else -1)
+            tricks.append(trick.mask)
+        choices = vectorized.play_batch(hands, trumps, leads, tricks)
+        return [player.hand.take(CARDS[choice])
+                for (player, game), choice in zip(states, choices)]
+
+    ask_tricks = 4.0        # Expected tricks needed to ask
+    join_tricks = 3.0       # Expected tricks needed to join an ask
 
     def bid(self, player, game):
+        import bidding
+
         possible_bids = game.get_possible_bids()
-        return possible_bids[0]
+        tricks = bidding.expected_tricks(player.hand.mask, game.trump.suit)
+        if tricks is None:
+            return possible_bids[0]
+        if 'ask' in possible_bids and tricks >= self.ask_tricks:
+            return 'ask'
+        if 'join' in possible_bids and tricks >= self.join_tricks:
+            return 'join'
+        return 'pass'
+
+    def bid_batch(self, states):
+        """
+        Bids for many (player, game) decision points at once, the same as
+        bid would make
+        """
+        import vectorized
+
+        states = list(states)
+        if type(self).bid.im_func is not AI.bid.im_func:
+            return [self.bid(player, game) for player, game in states]
+        if not states:
+            return []
+        possible = [game.get_possible_bids() for player, game in states]
+        choices = vectorized.bid_batch(
+            [player.hand.mask for player, game in states],
+            [game.trump.suit for player, game in states],
+            ['ask' in bids for bids in possible],
+            ['join' in bids for bids in possible],
+            self.ask_tricks, self.join_tricks)
+        return [BIDS[choice] if choice >= 0 else bids[0]
+                for bids, choice in zip(possible, choices)]
 
 
 class Human(object):
     def play(self, player, game):
         print(repr(player))
         print(repr(game.trick.winning_cards(player.valid_cards(game),
-                                            game.trump)))
+                                            game.trump.suit)))
         print('%s, which card? ' % player.name)
 
         sys.stdout.flush()
@@ -347,8 +743,6 @@ class Human(object):
 
 
 if __name__ == '__main__':
-    random.seed()
-
     print('Welcome to Belgian Whist!')
     g = Game((
         Player('Jef', Human()),
@@ -368,7 +762,7 @@ if __name__ == '__main__':
 
         player = g.players[g.playing]
 
-    g.mode.post_game()
+    g.post_game()
     g.collect()
     print('---')
     print('Ranking:')
@@ -1,32 +1,29 @@
 import Tkinter as Tk
 import os
-import time
-from PIL import ImageTk, Image
 
-from whist import Game, Player, AI, Human, Card, Trick
+from whist import Game, Player, AI, Human
+from instrumentation import Observer
+from sprites import Sprites
 
 
 class UIHuman(Human):
-    def play(self, player, game):
-        game.ui.clicked_card = None
-
-        def get_clicked_card():
-            if game.ui.clicked_card is None:
-                return None
-            player_id, card_id = game.ui.clicked_card
-            return game.players[player_id].hand[card_id]
-
-        game.ui.redraw()
+    """
+    Plays the card or bid the player chose in the UI before the game resumed
+    """
+    decision = None
 
-        while game.ui.clicked_card is None\
-                or not get_clicked_card() in player.valid_cards(game):
-            game.ui.parent.update()
-            time.sleep(0.03)
-
-        return player.hand.pop(player.hand.index(get_clicked_card()))
+    def play(self, player, game):
+        card, self.decision = self.decision, None
+        return player.hand.take(card)
 
     def bid(self, player, game):
-        self.proposition = None
+        bid, self.decision = self.decision, None
+        return bid
+
+    def ask_bid(self, player, game, callback):
+        """
+        Open a dialog for the bid, callback is called once it is made
+        """
         possible_bids = game.get_possible_bids()
         dialog = Tk.Toplevel(game.ui.parent)
         dialog.title('Bid')
@@ -35,19 +32,32 @@ class UIHuman(Human):
         Tk.Label(dialog, text="Possible bids: " + ', '.join(possible_bids)).pack()
         e = Tk.Entry(dialog)
         e.pack()
+        e.focus_set()
 
-        def callback():
-            self.proposition = e.get()
-            if self.proposition in possible_bids:
+        def bid(event=None):
+            proposition = e.get()
+            if proposition in possible_bids:
+                self.decision = proposition
                 dialog.destroy()
+                callback()
             else:
                 print("Please enter a valid bid.")
-        b = Tk.Button(dialog, text="Bid!", command=callback)
+        b = Tk.Button(dialog, text="Bid!", command=bid)
         b.pack()
+        e.bind('<Return>', bid)
+
 
-        dialog.wait_window()
+class TrickKeeper(Observer):
+    """
+    Remembers the last trick won, so it stays on the table for a while
+    """
+    trick = None
 
-        return self.proposition
+    def trick_won(self, game, t, player, trick, elapsed):
+        self.trick = trick
+
+    def deal_start(self, game, t):
+        self.trick = None
 
 
 def test_handler_factory(root):
@@ -57,7 +67,17 @@ def test_handler_factory(root):
 
 
 class WhistApp(Tk.Frame):
-    clicked_card = None
+    """
+    Plays the game on Tk's event loop
+
+    The deal advances one decision at a time through Game.turns. AI turns
+    are scheduled with after() to leave time to follow the play, the UI
+    player's turns wait for a card click or a bid, so nothing blocks or
+    polls while waiting.
+    """
+    delay = 1000            # Milliseconds before every AI card
+    turns = None            # Game.turns of the deal being played
+    waiting = None          # UI player whose card we wait for
     parent = None
     game = None
     size = (800, 600)
@@ -71,21 +91,20 @@ class WhistApp(Tk.Frame):
         self.parent = parent
         self.game = game
         self.game.ui = self
+        self.last_trick = TrickKeeper()
+        self.game.observers.append(self.last_trick)
 
         self.setup_ui()
         self.redraw()
-        self.parent.after(0, self.play_game)
+        self.parent.after(0, self.start_deal)
 
     def setup_ui(self):
         # Images
-        self.bg_img = ImageTk.PhotoImage(Image.open('cards/green020.png'))
-        cards = (str(Card(i % 13, i / 13)) for i in xrange(52))
-        self.card_imgs = dict((c, ImageTk.PhotoImage(
-            Image.open('cards/%s.gif' % (c[1]+c[0]).lower()))) for c in cards)
-        self.blank_img = ImageTk.PhotoImage(Image.open('cards/b1fv.gif'))
-
-        self.card_size = (self.card_imgs['2H'].width(),
-                          self.card_imgs['2H'].height())
+        self.sprites = Sprites(self.parent, 'cards')
+        self.bg_img = self.sprites['green020']
+        self.blank_img = self.sprites['b1fv']
+
+        self.card_size = self.sprites.size('h2')
         self.middle = ((self.size[0] - (self.card_offset[0] * 12 +
                                         self.card_size[0])) / 2,
                        (self.size[1] - (self.card_offset[1] * 12 +
@@ -96,6 +115,7 @@ class WhistApp(Tk.Frame):
                                 bg='darkgreen', highlightthickness=0)
         self.canvas.pack(fill=Tk.BOTH, expand=1)
         self.canvas.bg_tiles = {}
+        self.rendered = {}      # Canvas item -> options it was last given
 
         self.draw_background()
 
@@ -192,6 +212,9 @@ class WhistApp(Tk.Frame):
         self.pack(fill=Tk.BOTH, expand=1)
 
 
+    def card_img(self, card):
+        return self.sprites[(card.name[1] + card.name[0]).lower()]
+
     def draw_background(self):
         for x in range(self.size[0] / self.bg_img.width() + 1):
             for y in range(self.size[1] / self.bg_img.height() + 1):
@@ -201,93 +224,108 @@ class WhistApp(Tk.Frame):
                                                  image=self.bg_img, anchor='nw')
                     self.canvas.bg_tiles[(x, y)] = i
 
+    def configure_item(self, item, **options):
+        """
+        itemconfigure, skipped when the item already looks like that
+        """
+        if self.rendered.get(item) != options:
+            self.canvas.itemconfigure(item, **options)
+            self.rendered[item] = options
+
     def draw_trump(self):
-        img = self.card_imgs[str(self.game.trump)] if self.game.trump and not self.game.tricks else ''
-        self.canvas.itemconfigure(self.canvas.trump, image=img)
+        img = self.card_img(self.game.trump) if self.game.trump and not self.game.tricks else ''
+        self.configure_item(self.canvas.trump, image=img)
 
     def draw_players(self):
         for p in xrange(4):
-            self.canvas.itemconfigure(self.canvas.player_labels[p],
-                                      text = self.game.players[p].name)
+            player = self.game.players[p]
+            self.configure_item(self.canvas.player_labels[p],
+                                text=player.name)
 
+            cards = list(player.hand)
             for c in xrange(13):
-                if c >= len(self.game.players[p].hand):
+                if c >= len(cards):
                     img = ''
-                elif isinstance(self.game.players[p].ai, AI):
+                elif isinstance(player.ai, AI):
                     img = self.blank_img
                 else:
-                    img = self.card_imgs[str(self.game.players[p].hand[c])]
+                    img = self.card_img(cards[c])
 
-                self.canvas.itemconfigure(self.canvas.players[p][c],
-                                          image=img)
+                self.configure_item(self.canvas.players[p][c], image=img)
 
     def draw_tricks(self):
         for p in xrange(4):
             for c in xrange(13):
                 img = self.blank_img if c < len(self.game.players[p].tricks) else ''
-                self.canvas.itemconfigure(self.canvas.tricks[p][c], image=img)
+                self.configure_item(self.canvas.tricks[p][c], image=img)
 
     def draw_trick(self):
-        if self.game.trick:
-            for i in xrange(4):
-                img = ''
-                if i < len(self.game.trick.played_cards):
-                    img = self.card_imgs[str(self.game.trick.played_cards[i][0])]
-                self.canvas.itemconfigure(self.canvas.trick[(i + self.game.playing - 1) % 4], image=img)
-        else:
-            for c in self.canvas.trick:
-                self.canvas.itemconfigure(c, image='')
+        trick = self.game.trick
+        if not trick or not trick.played_cards:
+            trick = self.last_trick.trick
+        images = [''] * 4
+        if trick:
+            for card, player in trick.played_cards:
+                p = self.game.players.index(player)
+                images[(p - 1) % 4] = self.card_img(card)
+        for c, img in zip(self.canvas.trick, images):
+            self.configure_item(c, image=img)
 
     def handle_card_click_factory(self, tag):
         def handle_card_click(event):
-            self.clicked_card = self.tag_to_card[tag]
+            self.card_clicked(*self.tag_to_card[tag])
         return handle_card_click
 
+    def card_clicked(self, player_id, card_id):
+        player = self.waiting
+        if player is None or self.game.players[player_id] is not player or \
+                card_id >= len(player.hand):
+            return
+        card = player.hand[card_id]
+        if card in player.valid_cards(self.game):
+            self.waiting = None
+            player.ai.decision = card
+            self.advance()
+
     def redraw(self):
         self.draw_trump()
         self.draw_players()
         self.draw_trick()
         self.draw_tricks()
 
-    def play_game(self):
-        while True:
-            self.game.deck.shuffle()
-            self.game.deck.hef_af()
-            self.game.deal()
-            self.redraw()
-            self.game.bidding()
-            while len(self.game.players[self.game.playing].hand) > 0:
-                print('---')
-                self.game.trick = Trick()
-
-                currently_playing = self.game.playing
-                for i in xrange(4):
-                    player = self.game.players[currently_playing]
-                    played_card = player.play(self.game)
-                    self.game.trick.play(played_card, player)
-                    currently_playing = (currently_playing + 1) % 4
-                    self.redraw()
-                    self.parent.update()
-                    time.sleep(1)
-
-                winning_card, winning_player = self.game.trick.winning(self.game.trump.suit)
-                print('%s gets the trick' % winning_player)
-                self.game.tricks.append(self.game.trick)
-                winning_player.tricks.append(self.game.trick)
-                self.game.trick = None
-                self.game.playing = self.game.players.index(winning_player)
-                self.redraw()
-                self.parent.update()
-            print('---')
-            print('Ranking:')
-
-            for i in xrange(4):
-                print(self.game.players[i].name)
-                for t in self.game.players[i].tricks:
-                    print '*',
-                print('')
-            self.game.mode.post_game()
-            self.game.collect()
+    def start_deal(self):
+        self.turns = self.game.turns()
+        self.advance()
+
+    def advance(self):
+        """
+        Resume the deal up to the next decision and get that one going
+        """
+        try:
+            player, kind = next(self.turns)
+        except StopIteration:
+            return self.end_deal()
+        self.redraw()
+        if not isinstance(player.ai, UIHuman):
+            self.parent.after(self.delay if kind == 'play' else 0,
+                              self.advance)
+        elif kind == 'bid':
+            player.ai.ask_bid(player, self.game, self.advance)
+        else:
+            self.waiting = player
+
+    def end_deal(self):
+        self.redraw()
+        print('---')
+        print('Ranking:')
+
+        for i in xrange(4):
+            print(self.game.players[i].name)
+            for t in self.game.players[i].tricks:
+                print '*',
+            print('')
+        self.game.collect()
+        self.parent.after(self.delay, self.start_deal)
 
 
 if __name__ == '__main__':